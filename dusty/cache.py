@@ -0,0 +1,88 @@
+#   Copyright 2019 getcarrier.io
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+    Persistent on-disk cache with TTL
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+
+from time import time
+from dusty import constants as c
+
+
+class DiskCache(object):
+    """ Stores JSON-serializable values in files named by key hash """
+
+    def __init__(self, namespace, ttl=None, path=None):
+        base_path = path if path else os.environ.get("cache_path", c.PATH_TO_CACHE)
+        self.path = os.path.join(base_path, namespace)
+        self.ttl = c.CACHE_TTL if ttl is None else int(ttl)
+
+    def _key_path(self, key):
+        key_hash = hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+        return os.path.join(self.path, f"{key_hash}.json")
+
+    def get(self, key, default=None):
+        """ Returns cached value or default if it is missing or expired """
+        if self.ttl <= 0:
+            return default
+        key_path = self._key_path(key)
+        try:
+            if time() - os.path.getmtime(key_path) > self.ttl:
+                return default
+            with open(key_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return default
+
+    def set(self, key, value):
+        """ Stores value atomically, cache failures are not fatal """
+        if self.ttl <= 0:
+            return
+        tmp_path = None
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(value, f)
+            os.replace(tmp_path, self._key_path(key))
+        except (OSError, TypeError, ValueError):
+            logging.debug("Failed to store %s in cache %s", str(key), self.path)
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def invalidate(self, key=None):
+        """ Removes single key or whole namespace """
+        if key is None:
+            shutil.rmtree(self.path, ignore_errors=True)
+            return
+        try:
+            os.remove(self._key_path(key))
+        except OSError:
+            pass
+
+    def get_or_set(self, key, factory, should_store=bool):
+        """ Returns cached value, calls factory and caches its result on miss if should_store(result) """
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            if should_store(value):
+                self.set(key, value)
+        return value
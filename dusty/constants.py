@@ -17,12 +17,25 @@ NON_SCANNERS_CONFIG_KEYS = ['target_host', 'target_port', 'protocol', "/",
                             'safe_pipeline_mode', 'project_name', 'environment',
                             'test_type', 'junit_report', 'jira', 'jira_mapping', 'emails',
                             'min_priority', 'code_path', 'composition_analysis', 'influx',
-                            'code_source', 'loki']
+                            'code_source', 'loki', 'max_concurrency', 'concurrency_limits', 'work_dir',
+                            'memory_limit']
 SASTY_SCANNERS_CONFIG_KEYS = ['language', 'npm', 'retirejs', 'ptai', 'safety', 'scan_opts']
+SCANNERS_ENTRY_POINT_GROUP = "dusty.scanners"
+CONCURRENCY_NETWORK = "network"
+CONCURRENCY_CPU = "cpu"
+CONCURRENCY_REMOTE = "remote"
+# Megabytes
+DEFAULT_TOOL_MEMORY = 256
 READ_THROUGH_ENV = ['target_host', 'target_port', 'protocol', 'project_name', 'environment']
 CONFIG_ENV_KEY = "CARRIER_SCAN_CONFIG"
 PATH_TO_CONFIG = "/tmp/scan-config.yaml"
 PATH_TO_CODE = "/code"
+PATH_TO_WORK_DIR = "/tmp"
+PATH_TO_CACHE = "/tmp/dusty_cache"
+# Seconds
+CACHE_TTL = 24 * 3600
+EXECUTE_CHUNK_SIZE = 1024 * 1024
+PROCESS_TERMINATE_TIMEOUT = 10
 SEVERITIES = {
     'Info': 4,
     'Low': 3,
@@ -64,6 +77,13 @@ QUALYS_SEVERITIES = {
     4: 'High',
     5: 'Critical'
 }
+ENDPOINT_DEFAULT_PORTS = {
+    "http": "80",
+    "https": "443",
+    "ftp": "21"
+}
+# Rendered as host:port/protocol (nmap style) instead of protocol://host:port
+ENDPOINT_TRANSPORT_PROTOCOLS = ("tcp", "udp")
 ZAP_SEVERITIES = {
     "0": "Info",
     "1": "Low",
@@ -77,6 +97,22 @@ ZAP_CONFIDENCES = {
     "3": "High",
     "4": "User Confirmed"
 }
+ZAP_RISK_CODES = {
+    "Informational": "0",
+    "Low": "1",
+    "Medium": "2",
+    "High": "3"
+}
+ZAP_CONFIDENCE_CODES = {
+    "False Positive": "0",
+    "Low": "1",
+    "Medium": "2",
+    "High": "3",
+    "Confirmed": "4",
+    "User Confirmed": "4"
+}
+ZAP_ALERTS_PAGE_SIZE = 500
+MARKDOWN_CACHE_SIZE = 1024
 ZAP_BLACKLISTED_RULES = [
     10095  # Backup File Disclosure
 ]
@@ -85,11 +121,15 @@ ZAP_SCAN_POCILICES = {
     "sqli": [40018, 40019, 40020, 40021, 40022]
 }
 MAX_MESSAGE_LEN = 30000
+# Items waiting to be published to ReportPortal
+RP_QUEUE_SIZE = 1000
 FALSE_POSITIVE_CONFIG = '/tmp/false_positive.config'
+FALSE_POSITIVE_GLOB_PREFIX = 'glob:'
+FALSE_POSITIVE_REGEX_PREFIX = 'regex:'
 W3AF_OUTPUT_SECTION = """#Configure reporting in order to generate an HTML report
 output console, xml_file
 output config xml_file
-set output_file /tmp/w3af.xml
+set output_file {output_file}
 back
 output config console
 set verbose False
@@ -104,15 +144,40 @@ SEVERITY_TYPE = {
 }
 
 NVD_URL = 'https://nvd.nist.gov/vuln/detail/'
+NVD_MAX_WORKERS = 8
+NVD_REQUEST_TIMEOUT = 60
+# Packets per second, shared by all parallel masscan processes
+MASSCAN_DEFAULT_RATE = 1000
+MASSCAN_MIN_RATE = 100
+MASSCAN_MAX_RATE = 100000
+MASSCAN_RATE_STEP = 1000
+MASSCAN_DEFAULT_SHARDS = 1
+# With adaptive rate every process scans several smaller shards, so the rate can be adjusted between them
+MASSCAN_ADAPTIVE_ROUNDS = 4
+MASSCAN_TRANSMIT_ERRORS = r'transmit error|sendto|No buffer space|Resource temporarily unavailable'
+NMAP_DEFAULT_NSE_SCRIPTS = "ssl-date,http-mobileversion-checker,http-robots.txt,http-title," \
+                           "http-waf-detect,http-chrono,http-headers,http-comments-displayer,http-date"
+# Parallel service detection processes, "auto" means one per CPU core
+NMAP_DEFAULT_SHARDS = 1
 JIRA_DESCRIPTION_MAX_SIZE = 61908
 # This is jira.text.field.character.limit default value
 JIRA_COMMENT_MAX_SIZE = 32767
 JIRA_OPENED_STATUSES = ['Open', 'In Progress']
+# Number of issue hashes per bulk JQL search (keeps query length reasonable)
+JIRA_BULK_SEARCH_SIZE = 50
+JIRA_MAX_RETRIES = 5
+JIRA_MIN_POOL_SIZE = 10
+# Seconds, fields/projects/priorities metadata
+JIRA_METADATA_CACHE_TTL = 3600
+# Seconds, doubled on each retry
+JIRA_RETRY_BACKOFF = 1
 MIN_PRIORITY = 'Major'
 
 JIRA_FIELD_USE_DEFAULT_VALUE = '!default'
 JIRA_FIELD_DO_NOT_USE_VALUE = '!remove'
 
 PTAI_DEFAULT_FILTERED_STATUSES = ['discarded', 'suspected']
+PTAI_DEFAULT_PARSER_BACKEND = 'bs4'
+PTAI_PARSER_BACKENDS = ('bs4', 'lxml')
 QUALYS_STATUS_CHECK_INTERVAL = 60
 QUALYS_MAX_STATUS_CHECK_ERRORS = 7
@@ -23,8 +23,8 @@
 import re
 
 from collections import namedtuple
-from markdownify import markdownify as md
-from dusty.data_model.canonical_model import Endpoint, DefaultModel as Finding
+from dusty.data_model.canonical_model import make_endpoint, DefaultModel as Finding
+from dusty.data_model.markup import md
 
 
 class AemOutputParser(object):
@@ -72,7 +72,7 @@ def make_endpoint_from_url(url):
     if (protocol == "http" and port != "80") or (
             protocol == "https" and port != "443"):
         host_value = f'{parsed_url.hostname}:{parsed_url.port}'
-    return Endpoint(
+    return make_endpoint(
         protocol=parsed_url.protocol,
         host=host_value,
         fqdn=parsed_url.hostname,
@@ -14,29 +14,66 @@
 
 import hashlib
 import re
-import markdown2
+import sys
 import logging
-from junit_xml import TestCase
 from dusty import constants as c
+from collections.abc import Mapping, MutableMapping
 from dusty.utils import define_jira_priority
 
+TITLE_FILTER = re.compile('[^A-Za-zА-Яа-я0-9//\\\.\- _]+')
+
 
 class Endpoint(object):
+    """ Immutable endpoint value, normalized on creation so that equal endpoints compare and hash equal """
+    __slots__ = ("protocol", "host", "fqdn", "port", "path", "query", "fragment", "_key")
+
     def __init__(self, protocol=None, host=None, fqdn=None, port=None, path=None, query=None, fragment=None, **kwargs):
+        protocol = protocol.lower() if protocol else None
+        if host:
+            host = host.lower()
+            if host.count(":") == 1:  # Port included into host, IPv6 addresses are kept as is
+                host, _, host_port = host.partition(":")
+                if not port and host_port.isdigit():
+                    port = host_port
+        port = str(port) if port else None
+        if port and protocol and c.ENDPOINT_DEFAULT_PORTS.get(protocol, None) == port:
+            port = None
+        path = path.rstrip("/") if path else None
+        _set = super().__setattr__
+        _set("protocol", protocol)  # The communication protocol such as 'http', 'ftp', etc.
+        _set("host", host or None)  # The host name or IP address (without port)
+                                    # For example '127.0.0.1', 'localhost', 'yourdomain.com'.
+        _set("fqdn", fqdn.lower() if fqdn else None)  # Fully qualified domain name (FQDN) is the complete
+                                                      # domain name
+        _set("port", port)  # The network port associated with the endpoint (omitted if default for protocol)
+        _set("path", path or None)  # The location of the resource, it should start with a '/'.
+                                    # For example/endpoint/420/edit", trailing slash is removed
+        _set("query", query or None)  # "The query string, the question mark should be omitted.
+                                      # For example 'group=4&team=8'"
+        _set("fragment", fragment or None)  # "The fragment identifier which follows the hash mark. The hash mark
+                                            # should be omitted. For example 'section-13', 'paragraph-2'."
+        _set("_key", (self.protocol, self.host, self.fqdn, self.port, self.path, self.query, self.fragment))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Endpoint is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Endpoint is immutable")
+
+    def __eq__(self, other):
+        if not isinstance(other, Endpoint):
+            return NotImplemented
+        return self._key == other._key
 
-        self.protocol = protocol  # The communication protocol such as 'http', 'ftp', etc.
-        self.host = host    # The host name or IP address, you can also include the port number.
-                            # For example '127.0.0.1', '127.0.0.1:8080', 'localhost', 'yourdomain.com'.
-        self.fqdn = fqdn    # Fully qualified domain name (FQDN) is the complete domain name
-        self.port = port    # The network port associated with the endpoint.
-        self.path = path    # The location of the resource, it should start with a '/'.
-                            # For example/endpoint/420/edit"
-        self.query = query  # "The query string, the question mark should be omitted.
-                            # For example 'group=4&team=8'"
-        self.fragment = fragment  # "The fragment identifier which follows the hash mark. The hash mark should
-                                  # be omitted. For example 'section-13', 'paragraph-2'."
+    def __hash__(self):
+        return hash(self._key)
+
+    def __repr__(self):
+        return f"Endpoint({str(self)!r})"
 
     def __str__(self):
+        if self.protocol in c.ENDPOINT_TRANSPORT_PROTOCOLS:
+            return f"{self.fqdn if self.fqdn else self.host}:{self.port}/{self.protocol}"
         str_repr = ""
         if self.protocol:
             str_repr = f'{self.protocol}://'
@@ -51,7 +88,203 @@ class Endpoint(object):
         return str_repr
 
 
+endpoints_index = dict()
+
+
+def make_endpoint(**kwargs):
+    """ Returns shared Endpoint instance, equal endpoints from all parsers are stored once """
+    endpoint = Endpoint(**kwargs)
+    return endpoints_index.setdefault(endpoint, endpoint)
+
+
+def _invalidating(method):
+    def _wrapper(self, *args, **kwargs):
+        self.owner.invalidate()
+        return method(self, *args, **kwargs)
+    return _wrapper
+
+
+# Shared placeholder of empty list fields, finding gets list of its own when field is accessed for changes
+EMPTY_LIST = ()
+
+
+class TrackedList(list):
+    """ List that drops cached rendering of owner finding on in-place changes """
+    __slots__ = ("owner",)
+
+    def __init__(self, owner, iterable=()):
+        super().__init__(iterable)
+        self.owner = owner
+
+
+for _name in ["append", "extend", "insert", "remove", "pop", "clear", "sort", "reverse",
+              "__setitem__", "__delitem__", "__iadd__", "__imul__"]:
+    setattr(TrackedList, _name, _invalidating(getattr(list, _name)))
+
+
+class TrackedDict(dict):
+    """ Dict that drops cached rendering of owner finding on changes (nested values are tracked too) """
+    __slots__ = ("owner",)
+
+    def __init__(self, owner, mapping=()):
+        super().__init__()
+        self.owner = owner
+        for key, value in dict(mapping).items():
+            dict.__setitem__(self, key, track(owner, value))
+
+    def __setitem__(self, key, value):
+        self.owner.invalidate()
+        dict.__setitem__(self, key, track(self.owner, value))
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+
+for _name in ["__delitem__", "pop", "popitem", "clear"]:
+    setattr(TrackedDict, _name, _invalidating(getattr(dict, _name)))
+
+
+def track(owner, value):
+    """ Wrap dicts and lists so that their changes are visible to owner """
+    if isinstance(value, (TrackedDict, TrackedList)) and value.owner is owner:
+        return value
+    if isinstance(value, dict):
+        return TrackedDict(owner, value)
+    if isinstance(value, list):
+        return TrackedList(owner, value)
+    return value
+
+
+def intern_str(value):
+    """ Share one copy of repeated short strings (tool names, severities) across findings """
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class FindingView(MutableMapping):
+    """ Dict-like view over finding record slots, keeps finding['...'] access working """
+    __slots__ = ("owner", "children")
+    name = None
+    keys_order = ()  # All keys in original dict order
+    slots = dict()  # key -> attribute holding its value
+    interned = ()  # keys holding repeated short strings
+    lists = ()  # keys holding lists, EMPTY_LIST is replaced with own list on access
+    nested = dict()  # key -> view class
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.children = {key: view(owner) for key, view in self.nested.items()} if self.nested else None
+
+    def _extra_key(self, key):
+        return key if self.name is None else (self.name, key)
+
+    def _extra_keys(self):
+        extra = self.owner._extra
+        if not extra:
+            return []
+        if self.name is None:
+            return [key for key in extra if not isinstance(key, tuple)]
+        return [key[1] for key in extra if isinstance(key, tuple) and key[0] == self.name]
+
+    def __getitem__(self, key):
+        slot = self.slots.get(key, None)
+        if slot is not None:
+            return self.owner.own_list(slot) if key in self.lists else getattr(self.owner, slot)
+        if key in self.nested:
+            return self.children[key]
+        extra = self.owner._extra
+        if not extra or self._extra_key(key) not in extra:
+            raise KeyError(key)
+        return extra[self._extra_key(key)]
+
+    def __setitem__(self, key, value):
+        self.owner.invalidate()
+        slot = self.slots.get(key, None)
+        if slot is not None:
+            setattr(self.owner, slot, intern_str(value) if key in self.interned else track(self.owner, value))
+        elif key in self.nested:
+            view = self.children[key]
+            view.clear()
+            view.update(value)
+        else:
+            if self.owner._extra is None:
+                self.owner._extra = dict()
+            self.owner._extra[self._extra_key(key)] = track(self.owner, value)
+
+    def __delitem__(self, key):
+        self.owner.invalidate()
+        slot = self.slots.get(key, None)
+        if slot is not None:
+            setattr(self.owner, slot, None)
+        elif key in self.nested:
+            self.children[key].clear()
+        else:
+            extra = self.owner._extra
+            if not extra or self._extra_key(key) not in extra:
+                raise KeyError(key)
+            del extra[self._extra_key(key)]
+
+    def clear(self):
+        """ Reset all values (fixed keys stay in the view with None values) """
+        self.owner.invalidate()
+        for key in self.keys_order:
+            if key in self.nested:
+                self.children[key].clear()
+            else:
+                setattr(self.owner, self.slots[key], None)
+        for key in self._extra_keys():
+            del self.owner._extra[self._extra_key(key)]
+
+    def __iter__(self):
+        yield from self.keys_order
+        yield from self._extra_keys()
+
+    def __len__(self):
+        return len(self.keys_order) + len(self._extra_keys())
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class StaticDetailsView(FindingView):
+    __slots__ = ()
+    name = "static_finding_details"
+    keys_order = ("file_name", "line_number", "cwe", "url")
+    slots = {key: f"_static_{key}" for key in keys_order}
+
+
+class DynamicDetailsView(FindingView):
+    __slots__ = ()
+    name = "dynamic_finding_details"
+    keys_order = ("payload", "cwe", "url", "endpoints")
+    slots = {key: f"_dynamic_{key}" for key in keys_order}
+    lists = ("endpoints",)
+
+
+class RecordView(FindingView):
+    __slots__ = ()
+    keys_order = ("title", "date", "description", "severity", "confidence", "tool", "static_finding",
+                  "dynamic_finding", "steps_to_reproduce", "references", "impact", "mitigation",
+                  "severity_justification", "static_finding_details", "dynamic_finding_details",
+                  "error_string", "error_hash")
+    nested = {"static_finding_details": StaticDetailsView, "dynamic_finding_details": DynamicDetailsView}
+    slots = {key: f"_{key}" for key in keys_order if key not in ("static_finding_details",
+                                                                  "dynamic_finding_details")}
+    interned = ("severity", "confidence", "tool")
+    lists = ("steps_to_reproduce",)
+
+
 class DefaultModel(object):
+    __slots__ = tuple(RecordView.slots.values()) + tuple(StaticDetailsView.slots.values()) + \
+        tuple(DynamicDetailsView.slots.values()) + \
+        ("_extra", "_view", "severity", "scan_type", "_images", "_endpoints", "_unsaved_endpoints",
+         "_render_cache", "_hash", "_hash_source", "_hash_digest")
+
     def __init__(self, title, severity, description, tool, endpoints=None,
                  scanner_confidence=None, static_finding=None, dynamic_finding=None,
                  impact=None, mitigation=None, date=None, cwe=None, url=None,
@@ -60,50 +293,99 @@ class DefaultModel(object):
                  sourcefilepath=None, sourcefile=None, param=None,
                  payload=None, line=None, file_path=None,
                  **kwags):
-        endpoints = [] if not endpoints else endpoints
+        self._extra = None
+        self._view = None
+        self._render_cache = None
+        self._hash = None
+        self._hash_source = None
+        self._hash_digest = None
         if not file_path:
             file_path = sourcefilepath if sourcefilepath else ''
             if sourcefile:
                 file_path += '.' + sourcefile
-        self.finding = {
-            "title": re.sub('[^A-Za-zА-Яа-я0-9//\\\.\- _]+', '', title),
-            "date": date,
-            "description": description.replace("\n", "\n\n"),
-            "severity": severity,
-            "confidence": scanner_confidence,
-            "tool": tool,
-            "static_finding": static_finding,
-            "dynamic_finding": dynamic_finding,
-            "steps_to_reproduce": [],
-            "references": references,
-            "impact": impact,
-            "mitigation": mitigation,
-            "severity_justification": severity_justification,
-            "static_finding_details": {
-                "file_name": file_path,
-                "line_number": line if line else line_number,
-                "cwe": cwe,
-                "url": url
-            },
-            "dynamic_finding_details": {
-                "payload": payload if payload else param,
-                "cwe": cwe,
-                "url": url,
-                "endpoints": endpoints
-            },
-            "error_string": None,
-            "error_hash": None
-        }
+        self._title = TITLE_FILTER.sub('', title)
+        self._date = date
+        self._description = description.replace("\n", "\n\n")
+        self._severity = intern_str(severity)
+        self._confidence = intern_str(scanner_confidence)
+        self._tool = intern_str(tool)
+        self._static_finding = static_finding
+        self._dynamic_finding = dynamic_finding
+        self._references = references
+        self._impact = impact
+        self._mitigation = mitigation
+        self._severity_justification = severity_justification
+        self._static_file_name = file_path
+        self._static_line_number = line if line else line_number
+        self._static_cwe = cwe
+        self._static_url = url
+        self._dynamic_payload = payload if payload else param
+        self._dynamic_cwe = cwe
+        self._dynamic_url = url
+        self._dynamic_endpoints = TrackedList(self, endpoints) if endpoints else EMPTY_LIST
+        self._error_string = None
+        self._error_hash = None
         if isinstance(steps_to_reproduce, list):
-            self.finding['steps_to_reproduce'] = steps_to_reproduce
-        elif steps_to_reproduce:
-            self.finding['steps_to_reproduce'].append(steps_to_reproduce)
+            self._steps_to_reproduce = TrackedList(self, steps_to_reproduce) if steps_to_reproduce else EMPTY_LIST
+        else:
+            self._steps_to_reproduce = TrackedList(self, [steps_to_reproduce]) if steps_to_reproduce else EMPTY_LIST
         self.severity = c.SEVERITIES.get(severity, 100) #TODO: space for bugbar
-        self.unsaved_endpoints = []
-        self.images = [] if not images else images
-        self.endpoints = []
+        self._images = images if images else EMPTY_LIST
+        self._endpoints = EMPTY_LIST
+        self._unsaved_endpoints = EMPTY_LIST
         self.scan_type = ""
 
+    def own_list(self, slot, tracked=True):
+        """ Returns list from slot, shared EMPTY_LIST is replaced with list of this finding as caller may change it """
+        value = getattr(self, slot)
+        if value is EMPTY_LIST:
+            value = TrackedList(self) if tracked else list()
+            setattr(self, slot, value)
+        return value
+
+    @property
+    def finding(self):
+        if self._view is None:
+            self._view = RecordView(self)
+        return self._view
+
+    @finding.setter
+    def finding(self, value):
+        view = self.finding
+        view.clear()
+        view.update(value)
+
+    @property
+    def endpoints(self):
+        return self.own_list("_endpoints")
+
+    @endpoints.setter
+    def endpoints(self, value):
+        self.invalidate()
+        self._endpoints = track(self, value)
+
+    @property
+    def unsaved_endpoints(self):
+        return self.own_list("_unsaved_endpoints")
+
+    @unsaved_endpoints.setter
+    def unsaved_endpoints(self, value):
+        self.invalidate()
+        self._unsaved_endpoints = track(self, value)
+
+    @property
+    def images(self):
+        return self.own_list("_images", tracked=False)
+
+    @images.setter
+    def images(self, value):
+        self._images = value
+
+    def invalidate(self):
+        """ Drop cached rendering and hash, called on any change of finding data or endpoints """
+        self._render_cache = None
+        self._hash = None
+
     def get_numerical_severity(self) -> int:
         return 0
 
@@ -113,7 +395,7 @@ class DefaultModel(object):
 
     def finding_error_string(self) -> str:
         endpoint_str = ""
-        for e in self.endpoints:
+        for e in self._endpoints or ():
             endpoint_str += str(e)
         return f'{self.finding["title"]}_' \
                f'{self.finding["static_finding_details"]["cwe"]}_' \
@@ -122,10 +404,25 @@ class DefaultModel(object):
                f'{endpoint_str}'
 
     def get_hash_code(self) -> str:
-        hash_string = self.finding_error_string().strip()
-        return hashlib.sha256(hash_string.encode('utf-8')).hexdigest()
+        if self._hash is None:
+            hash_string = self.finding_error_string().strip()
+            if hash_string != self._hash_source:
+                self._hash_source = hash_string
+                self._hash_digest = hashlib.sha256(hash_string.encode('utf-8')).hexdigest()
+            self._hash = self._hash_digest
+        return self._hash
 
     def __str__(self, overwrite_steps_to_reproduce=None):
+        cached = self._render_cache.get(overwrite_steps_to_reproduce, None) if self._render_cache else None
+        if cached is None:
+            cached = (self._render(overwrite_steps_to_reproduce), self.scan_type)
+            if self._render_cache is None:
+                self._render_cache = dict()
+            self._render_cache[overwrite_steps_to_reproduce] = cached
+        finding, self.scan_type = cached
+        return finding
+
+    def _render(self, overwrite_steps_to_reproduce=None):
         finding = f'\n### Title: {self.finding["title"]}\n\n' \
                   f'### Description:\n {self.finding["description"]}\n\n' \
                   f'**Tool**: {self.finding["tool"]}\n\n' \
@@ -133,15 +430,15 @@ class DefaultModel(object):
                   f"**Issue Hash**: {self.get_hash_code()}\n\n"
         if overwrite_steps_to_reproduce:
             finding += f"**Steps To Reproduce**: {overwrite_steps_to_reproduce}"
-        elif self.finding['steps_to_reproduce']:
-            steps = self._stringify('\n\n'.join(self.finding['steps_to_reproduce']))
+        elif self._steps_to_reproduce:
+            steps = self._stringify('\n\n'.join(self._steps_to_reproduce))
             finding += f"**Steps To Reproduce**: {steps}"
         for each in self.finding:
             if each in ["error_string", "error_hash", "images", "title", "description", "tool", "severity",
                         "dynamic_finding", "static_finding", "static_finding_details", "steps_to_reproduce"]:
                 continue
             else:
-                if self.finding[each] and 'N/A' not in self.finding[each] and not isinstance(self.finding[each], dict):
+                if self.finding[each] and 'N/A' not in self.finding[each] and not isinstance(self.finding[each], Mapping):
                     finding += f"**{self._stringify(each)}**: {self._stringify(self.finding[each])}\n"
 
         if self.finding['static_finding_details']['file_name']:
@@ -152,7 +449,8 @@ class DefaultModel(object):
             if self.finding["static_finding_details"]["line_number"]:
                 finding += f': {self.finding["static_finding_details"]["line_number"]}'
             finding += '\n\n'
-        endpoints = set(self.finding['dynamic_finding_details']['endpoints'] + self.unsaved_endpoints + self.endpoints)
+        endpoints = dict.fromkeys((self._dynamic_endpoints or []) + (self._unsaved_endpoints or []) +
+                                  (self._endpoints or []))
         if endpoints:
             self.scan_type = "DAST"
             finding += "***Endpoints***:\n"
@@ -168,21 +466,18 @@ class DefaultModel(object):
         tags = [f'Tool: {self.finding["tool"]}', f'TestType: {self.scan_type}', f'Severity: {self.finding["severity"]}']
         if self.finding['confidence']:
             tags.append(f'Confidence: {self.finding["confidence"]}')
-        rp_data_writer.start_test_item(self.finding["title"],
-                                       description=self.finding['description'],
-                                       tags=tags)
-        if self.images:
-            for attachment in self.images:
-                rp_data_writer.test_item_message(attachment['name'], 'INFO', attachment)
-        rp_data_writer.test_item_message('!!!MARKDOWN_MODE!!! %s ' % item_details, 'INFO')
-        rp_data_writer.test_item_message(self.get_hash_code(), 'ERROR')
-        rp_data_writer.finish_test_item()
+        messages = [(attachment['name'], 'INFO', attachment) for attachment in self._images or ()]
+        messages.append(('!!!MARKDOWN_MODE!!! %s ' % item_details, 'INFO', None))
+        messages.append((self.get_hash_code(), 'ERROR', None))
+        rp_data_writer.publish_item(self.finding["title"], self.finding['description'], tags, messages)
 
     def html_item(self):
+        import markdown2  # Only needed for HTML reports
         self.finding['steps_to_reproduce'] = self.html_steps_to_reproduce()
         return markdown2.markdown(self.__str__(), extras=["tables"])
 
     def junit_item(self):
+        from junit_xml import TestCase  # Only needed for jUnit reports
         tc = TestCase(self.finding['title'], classname=self.finding["tool"])
         message = self.__str__()
         tc.add_error_info(message=message, error_type=self.finding['severity'])
@@ -190,7 +485,7 @@ class DefaultModel(object):
 
     def html_steps_to_reproduce(self):
         steps = []
-        for step in self.finding['steps_to_reproduce']:
+        for step in self._steps_to_reproduce or ():
             step = step.replace("{code:collapse=true}\n\n", "<pre>")
             step = step.replace("\n\n{code}", "</pre>")
             steps.append(step)
@@ -198,7 +493,7 @@ class DefaultModel(object):
 
     def jira_steps_to_reproduce(self):
         steps = []
-        for step in self.finding['steps_to_reproduce']:
+        for step in self._steps_to_reproduce or ():
             steps.append(step.replace("<pre>", "{code:collapse=true}\n\n").replace("</pre>", "\n\n{code}"))
         return steps
 
@@ -36,10 +36,11 @@ class GosecOutputParser:
         "UNDEFINED": "Info"
     }
 
-    def __init__(self, output, _):
+    def __init__(self, filename, _):
         self.items = list()
-        # Parse JSON from gosec stdout
-        data = json.loads(output[0].decode("utf-8"))
+        # Parse JSON saved from gosec stdout
+        with open(filename, "rb") as f:
+            data = json.load(f)
         # Populate findings
         all_items = OrderedDict()
         for item in data["Issues"]:
@@ -0,0 +1,80 @@
+#!/usr/bin/python3
+# coding=utf-8
+# pylint: disable=W1401,R0903
+
+#   Copyright 2019 getcarrier.io
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+    Shared markup helpers for parsers: cached HTML to markdown conversion and escaping
+"""
+
+import hashlib
+import logging
+import threading
+
+from collections import OrderedDict
+from markdownify import markdownify
+
+from dusty import constants as c
+
+
+class MarkdownCache(object):
+    """ Bounded LRU cache of HTML to markdown conversions keyed by source hash """
+
+    def __init__(self, max_size=c.MARKDOWN_CACHE_SIZE):
+        self.max_size = max_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def convert(self, source):
+        """ Returns markdown for HTML source, converting it once """
+        if not source:
+            return markdownify(source)
+        key = hashlib.sha1(source.encode("utf-8")).digest()
+        with self.lock:
+            if key in self.cache:
+                self.hits += 1
+                self.cache.move_to_end(key)
+                return self.cache[key]
+            self.misses += 1
+        result = markdownify(source)
+        with self.lock:
+            self.cache[key] = result
+            if len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+        return result
+
+    def log_stats(self):
+        logging.debug("Markdown cache: %d hits, %d misses, %d entries", self.hits, self.misses, len(self.cache))
+
+
+markdown_cache = MarkdownCache()
+
+
+def md(source):
+    """ Cached markdownify """
+    return markdown_cache.convert(source)
+
+
+MD_TABLE_ESCAPE = str.maketrans(dict(
+    [(char, f"\\{char}") for char in "\\`*_{}[]()#|+-.!"] + [("\n", " ")]
+))
+
+
+def md_table_escape(string):
+    """ Escape markdown special symbols """
+    return string.translate(MD_TABLE_ESCAPE)
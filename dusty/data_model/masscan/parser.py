@@ -12,19 +12,88 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
-from json import load
-from dusty.data_model.canonical_model import DefaultModel as Finding
+import json
+import logging
+import threading
+
+from dusty.utils import LineSink
+from dusty.data_model.canonical_model import make_endpoint, DefaultModel as Finding
 
 
 class MasscanJSONParser(object):
-    def __init__(self, file, test):
-        with open(file, "rb") as f:
-            data = load(f)
+    """
+    Parses masscan -oJ output
+
+    Reports are read line by line (masscan writes one record per line), so the parser can also be
+    fed incrementally from running masscan processes through stream()
+    """
+
+    def __init__(self, file=None, test=None):
+        self.test = test
         self.items = []
-        for issue in data:
-            title = f'Open port {issue["ports"][0]["port"]} found on {issue["ip"]}'
+        self._seen = set()
+        self._lock = threading.Lock()
+        files = [] if file is None else [file] if isinstance(file, str) else file
+        for each in files:
+            pending = []
+            with open(each, "r") as f:
+                for line in f:
+                    self.feed_line(line, pending)
+            self.drop_pending(pending)
+
+    def stream(self):
+        """ Returns sink for single masscan output stream, several streams may feed the parser at once """
+        return MasscanStream(self)
+
+    def feed_line(self, line, pending):
+        """ Adds findings from single output line, multi-line (pretty-printed) records are kept in pending """
+        line = line.strip()
+        if not line or (not pending and line in ("[", "]", ",")):
+            return
+        pending.append(line)
+        try:
+            record = json.loads(" ".join(pending).rstrip(","))
+        except ValueError:
+            return
+        del pending[:]
+        with self._lock:
+            for each in record if isinstance(record, list) else [record]:
+                self.add_record(each)
+
+    @staticmethod
+    def drop_pending(pending):
+        """ Drops incomplete trailing record, e.g. '{finished: 1}' written by some masscan versions """
+        if pending:
+            logging.debug("Skipped incomplete masscan output: %s", " ".join(pending)[:200])
+        del pending[:]
+
+    def add_record(self, issue):
+        if not isinstance(issue, dict) or "ip" not in issue:
+            return
+        for port in issue.get("ports", []):
+            if port.get("status", "open") != "open":
+                continue
+            # Parallel shards and banner records may report the same port more than once
+            key = (issue["ip"], port["port"], port.get("proto"))
+            if key in self._seen:
+                continue
+            self._seen.add(key)
+            title = f'Open port {port["port"]} found on {issue["ip"]}'
             self.items.append(Finding(title=title, tool="masscan",
                                       active=False, verified=False,
                                       description=title,
                                       severity="Info",
-                                      endpoints=[f'{issue["ip"]}:{issue["ports"][0]["port"]}']))
+                                      endpoints=[make_endpoint(host=issue["ip"], port=port["port"])]))
+
+
+class MasscanStream(LineSink):
+    """ Feeds lines of one masscan output stream into parser, keeping its own pending record """
+
+    def __init__(self, parser):
+        super().__init__(lambda line: parser.feed_line(line, self.pending))
+        self.parser = parser
+        self.pending = []
+
+    def close(self):
+        super().close()
+        self.parser.drop_pending(self.pending)
@@ -6,7 +6,7 @@ from defusedxml import ElementTree as ET
 import hashlib
 from urllib.parse import urlparse
 
-from dusty.data_model.canonical_model import Endpoint, DefaultModel as Finding
+from dusty.data_model.canonical_model import make_endpoint, DefaultModel as Finding
 
 
 class NiktoXMLParser(object):
@@ -56,8 +56,8 @@ class NiktoXMLParser(object):
 
             if dupe_key in dupes:
                 finding = dupes[dupe_key]
-                if finding.description:
-                    finding.description = finding.description + "\nHost:" + ip + "\n" + description
+                if finding.finding['description']:
+                    finding.finding['description'] = finding.finding['description'] + "\nHost:" + ip + "\n" + description
                 self.process_endpoints(finding, ip)
                 dupes[dupe_key] = finding
             else:
@@ -103,10 +103,10 @@ class NiktoXMLParser(object):
             host)
         protocol = rhost.group(1)
         host = rhost.group(4)
-        endpoint = Endpoint(protocol=protocol,
-                            host=host,
-                            query=query,
-                            fragment=fragment,
-                            path=path)
+        endpoint = make_endpoint(protocol=protocol,
+                                 host=host,
+                                 query=query,
+                                 fragment=fragment,
+                                 path=path)
 
         finding.unsaved_endpoints = finding.unsaved_endpoints + [endpoint]
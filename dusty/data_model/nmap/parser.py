@@ -1,6 +1,6 @@
 from xml.dom import NamespaceErr
 import lxml.etree as le
-from dusty.data_model.canonical_model import Endpoint, DefaultModel as Finding
+from dusty.data_model.canonical_model import make_endpoint, DefaultModel as Finding
 
 __author__ = 'patriknordlen'
 # Modified for Dusty by arozumenko
@@ -8,32 +8,60 @@ __author__ = 'patriknordlen'
 
 class NmapXMLParser(object):
     def __init__(self, file, test):
-        parser = le.XMLParser(resolve_entities=False, huge_tree=True)
-        nscan = le.parse(file, parser)
-        root = nscan.getroot()
+        # Sharded scans produce one report per nmap process, findings are merged by port and host
+        files = [file] if isinstance(file, str) else file
+        dupes = {}
+        for each in files:
+            self.parse_report(each, test, dupes)
+        self.items = dupes.values()
 
+    @staticmethod
+    def iter_hosts(file):
+        """ Yields <host> elements one by one, dropping already processed ones from the tree """
+        context = le.iterparse(file, events=("start", "end"), resolve_entities=False, huge_tree=True)
+        event, root = next(context)
         if 'nmaprun' not in root.tag:
             raise NamespaceErr("This doesn't seem to be a valid Nmap xml file.")
-        dupes = {}
-        hostInfo = ""
+        for event, elem in context:
+            if event != "end" or elem.tag != "host":
+                continue
+            yield elem
+            elem.clear()
+            while elem.getprevious() is not None:
+                del root[0]
 
-        for host in root.iter("host"):
-            ip = host.find("address[@addrtype='ipv4']").attrib['addr']
+    @staticmethod
+    def get_host_info(host, ip, fqdn):
+        """ Describes host OS detection results, empty if nmap did not run OS detection """
+        host_info = ""
+        for os_elem in host.iterfind("os"):
+            host_info += f"IP Address: {ip}\n"
+            if fqdn is not None:
+                host_info += f"FQDN: {fqdn}\n"
+            for osv in os_elem.iter('osmatch'):
+                if 'name' in osv.attrib:
+                    host_info += "Host OS: %s\n" % osv.attrib['name']
+                if 'accuracy' in osv.attrib:
+                    host_info += "Accuracy: {0}%\n".format(osv.attrib['accuracy'])
+            host_info += "\n"
+        return host_info
+
+    @staticmethod
+    def parse_report(file, test, dupes):
+        severity = "Info"
+        for host in NmapXMLParser.iter_hosts(file):
+            address = host.find("address[@addrtype='ipv4']")
+            if address is None:
+                address = host.find("address[@addrtype='ipv6']")
+            if address is None:
+                continue
+            ip = address.attrib['addr']
             fqdn = None
-            if host.find("hostnames/hostname[@type='PTR']") is not None:
-                fqdn = host.find("hostnames/hostname[@type='PTR']").attrib['name']
+            hostname = host.find("hostnames/hostname[@type='PTR']")
+            if hostname is not None:
+                fqdn = hostname.attrib['name']
+            hostInfo = NmapXMLParser.get_host_info(host, ip, fqdn)
 
-            for os in root.iter("os"):
-                if ip is not None:
-                    hostInfo += "IP Address: %s\n" % ip
-                if fqdn is not None:
-                    fqdn += "FQDN: %s\n" % ip
-                for osv in os.iter('osmatch'):
-                    if 'name' in osv.attrib:
-                        hostInfo += "Host OS: %s\n" % osv.attrib['name']
-                    if 'accuracy' in osv.attrib:
-                        hostInfo += "Accuracy: {0}%\n".format(osv.attrib['accuracy'])
-                hostInfo += "\n"
             for portelem in host.xpath("ports/port[state/@state='open']"):
                 port = portelem.attrib['portid']
                 protocol = portelem.attrib['protocol']
@@ -41,30 +69,22 @@ class NmapXMLParser(object):
                 title = f"Open port: {ip}:{port}/{protocol}"
                 description = hostInfo
                 description += f"Port: {port}\n"
-                serviceinfo = ""
-
-                if portelem.find('service') is not None:
-                    if 'product' in portelem.find('service').attrib:
-                        serviceinfo += "Product: %s\n" % portelem.find('service').attrib['product']
 
-                    if 'version' in portelem.find('service').attrib:
-                        serviceinfo += "Version: %s\n" % portelem.find('service').attrib['version']
-
-                    if 'extrainfo' in portelem.find('service').attrib:
-                        serviceinfo += "Extra Info: %s\n" % portelem.find('service').attrib['extrainfo']
-
-                    description += serviceinfo
+                service = portelem.find('service')
+                if service is not None:
+                    if 'product' in service.attrib:
+                        description += "Product: %s\n" % service.attrib['product']
+                    if 'version' in service.attrib:
+                        description += "Version: %s\n" % service.attrib['version']
+                    if 'extrainfo' in service.attrib:
+                        description += "Extra Info: %s\n" % service.attrib['extrainfo']
 
                 description += '\n\n'
 
-                severity = "Info"
-
                 dupe_key = f'{port}_{protocol}_{ip}'
-                print(dupe_key)
                 if dupe_key in dupes:
                     find = dupes[dupe_key]
-                    if description is not None:
-                        find.description += description
+                    find.finding['description'] += description
                 else:
                     find = Finding(title=title,
                                    tool="NMAP",
@@ -74,6 +94,5 @@ class NmapXMLParser(object):
                                    description=description,
                                    severity=severity,
                                    numerical_severity=Finding.get_numerical_severity(severity))
-                    find.unsaved_endpoints.append(f'{ip}:{port}/{protocol}')
+                    find.unsaved_endpoints.append(make_endpoint(protocol=protocol, host=ip, port=port))
                     dupes[dupe_key] = find
-        self.items = dupes.values()
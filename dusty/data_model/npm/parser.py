@@ -29,7 +29,8 @@ class NpmScanParser(object):
         self.items = []
         if not os.path.exists(filename):
             return
-        data = json.load(open(filename))
+        with open(filename, encoding="utf-8", errors="ignore") as f:
+            data = json.load(f)
         advisories = data.get('advisories')
         for action in data['actions']:
             module = action.get('module')
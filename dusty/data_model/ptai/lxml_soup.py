@@ -0,0 +1,87 @@
+#   Copyright 2018 getcarrier.io
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+    Minimal BeautifulSoup-like wrapper over lxml.html used by PTAI parser
+"""
+
+import re
+
+from lxml import etree, html
+
+
+SELECT_PATTERN = re.compile(r'^(?P<tag>[\w-]+)\[(?P<attr>[\w-]+)\*="(?P<value>[^"]*)"\]$')
+
+
+class LxmlSoup(object):
+    """ Wraps lxml element, supports find/find_all by tag and class, simple select, text and attrs """
+    __slots__ = ("element",)
+
+    xpath_cache = dict()
+
+    def __init__(self, element):
+        self.element = element
+
+    @classmethod
+    def parse(cls, filename):
+        parser = html.HTMLParser(encoding="utf8", huge_tree=True)
+        return cls(html.parse(filename, parser).getroot())
+
+    @classmethod
+    def _xpath(cls, key, builder):
+        xpath = cls.xpath_cache.get(key, None)
+        if xpath is None:
+            xpath = etree.XPath(builder())
+            cls.xpath_cache[key] = xpath
+        return xpath
+
+    def _run(self, key, builder):
+        return [LxmlSoup(item) for item in self._xpath(key, builder)(self.element)]
+
+    def find_all(self, tag, attrs=None):
+        classes = (attrs or dict()).get("class", None)
+        if classes is None:
+            return self._run((tag,), lambda: f".//{tag}")
+        if isinstance(classes, str):
+            classes = [classes]
+        classes = tuple(classes)
+
+        def _builder():
+            conditions = " or ".join(
+                f"contains(concat(' ', normalize-space(@class), ' '), ' {item} ')" for item in classes
+            )
+            return f".//{tag}[{conditions}]"
+        return self._run((tag, classes), _builder)
+
+    def find(self, tag, attrs=None):
+        items = self.find_all(tag, attrs)
+        return items[0] if items else None
+
+    def select(self, selector):
+        match = SELECT_PATTERN.match(selector)
+        if match is None:
+            raise ValueError(f"Unsupported selector: {selector}")
+        tag, attr, value = match.group("tag", "attr", "value")
+        return self._run(selector, lambda: f'.//{tag}[contains(@{attr}, "{value}")]')
+
+    @property
+    def text(self):
+        return self.element.text_content()
+
+    @property
+    def attrs(self):
+        attrs = dict(self.element.attrib)
+        if "class" in attrs:
+            attrs["class"] = attrs["class"].split()
+        return attrs
@@ -18,46 +18,65 @@ import re
 from bs4 import BeautifulSoup
 from dusty import constants
 from dusty.data_model.canonical_model import DefaultModel as Finding
+from dusty.data_model.ptai.lxml_soup import LxmlSoup
 
 
 __author__ = 'KarynaTaranova'
 
+BLANK_LINES_PATTERNS = [re.compile('\n( *\n)'), re.compile('\n+')]
+
 
 class PTAIScanParser(object):
-    def __init__(self, filename, filtered_statuses=constants.PTAI_DEFAULT_FILTERED_STATUSES):
+    def __init__(self, filename, filtered_statuses=constants.PTAI_DEFAULT_FILTERED_STATUSES,
+                 parser_backend=constants.PTAI_DEFAULT_PARSER_BACKEND):
         """
         :param filename:
         :param filtered_statuses: str with statuses, separated ', '
+        :param parser_backend: 'bs4' (BeautifulSoup html.parser) or 'lxml' (faster on big reports)
         """
         file_path_descriptions_list = ['Уязвимый файл', 'Vulnerable File']
 
         def trim_blank_lines(line):
-            blank_lines_patterns = ['\n( *\n)', '\n+']
-            for pattern in blank_lines_patterns:
-                finds = re.findall(pattern, line)
+            if line.count('\n') < 2:  # Nothing to trim
+                return line
+            for pattern in BLANK_LINES_PATTERNS:
+                finds = pattern.findall(line)
                 for find in finds:
                     line = line.replace(find, '\n')
             return line
 
-        def get_value_by_description(table_soap, descriptions):
-            option_descriptions_soup = table_soap.select('td[class*="option-description"]')
-            option_descriptions = [item.text for item in option_descriptions_soup]
-            value_index = -1
-            value = ''
+        def index_options(table_soap):
+            """ Maps option descriptions to values (n-th description to n-th value) in one pass """
+            option_descriptions = []
+            option_values = []
+            for item in table_soap.select('td[class*="option-"]'):
+                classes = ' '.join(item.attrs.get('class', []))
+                if 'option-description' in classes:
+                    option_descriptions.append(item.text)
+                elif 'option-value' in classes:
+                    option_values.append(item.text)
+            options = {}
+            for description, value in zip(option_descriptions, option_values):
+                options.setdefault(description, value)
+            return options
+
+        def get_value_by_description(options, descriptions):
             for description in descriptions:
-                if description in option_descriptions:
-                    value_index = option_descriptions.index(description)
-                    break
-            if value_index >= 0:
-                option_values_soup = table_soap.select('td[class*="option-value"]')
-                value = option_values_soup[value_index].text
-            return value
+                if description in options:
+                    return options[description]
+            return ''
 
+        if parser_backend not in constants.PTAI_PARSER_BACKENDS:
+            raise ValueError(f"Unsupported PTAI parser backend: {parser_backend}, "
+                             f"expected one of: {', '.join(constants.PTAI_PARSER_BACKENDS)}")
         dupes = dict()
         self.items = []
         if not os.path.exists(filename):
             return
-        soup = BeautifulSoup(open(filename, encoding="utf8"), 'html.parser')
+        if parser_backend == 'lxml':
+            soup = LxmlSoup.parse(filename)
+        else:
+            soup = BeautifulSoup(open(filename, encoding="utf8"), 'html.parser')
         vulnerabilities_info = {}
         vulnerabilities_info_soup = soup.find_all('div', {'class': 'type-description'})
         for vulnerability_info_soup in vulnerabilities_info_soup:
@@ -81,7 +100,8 @@ class PTAIScanParser(object):
             if severity_level_soup:
                 title = severity_level_soup[0].text
                 # Get file path (strip line number if present)
-                file_path = get_value_by_description(vulnerability_soup, file_path_descriptions_list).rsplit(' : ', 1)[0]
+                file_path = get_value_by_description(index_options(vulnerability_soup),
+                                                     file_path_descriptions_list).rsplit(' : ', 1)[0]
                 if '\\' in file_path:
                     short_file_path = ' in ...\\' + file_path.split('\\')[-1]
                 severity_classes_soup = severity_level_soup[0].attrs.get('class')
@@ -15,6 +15,8 @@
 import logging
 import base64
 import html
+
+from collections import namedtuple
 from lxml import etree
 from dusty import constants as c
 from dusty.data_model.canonical_model import DefaultModel as Finding
@@ -25,11 +27,9 @@ __author__ = "arozumenko"
 class QualysWebAppParser(object):
     def __init__(self, file, test):
         self.items = []
-        parser = etree.XMLParser(remove_blank_text=True, no_network=True, recover=True)
-        d = etree.parse(file, parser)
-        qids = d.xpath('/WAS_WEBAPP_REPORT/GLOSSARY/QID_LIST/QID')
+        glossary, vulnerabilities, information = self.index_report(file)
         disabled_titles = ['Scan Diagnostics']
-        for qid in qids:
+        for qid in glossary:
             qid_title = qid.findtext('TITLE')
             if qid_title not in disabled_titles:
                 _qid = qid.findtext('QID')
@@ -49,24 +49,16 @@ class QualysWebAppParser(object):
                 entrypoints = []
                 if 'Information Gathered' in qid_category:
                     qid_severity = 'Info'
-                    records = d.xpath(f'//INFORMATION_GATHERED_LIST/INFORMATION_GATHERED/QID[text()="{_qid}"]/..')
-                    for record in records:
-                        references.append(html.escape(base64.b64decode(record.findtext('DATA')).decode("utf-8", errors="ignore")))
+                    references.extend(information.get(_qid, []))
                 else:
-                    records = d.xpath(f'//VULNERABILITY_LIST/VULNERABILITY/QID[text()="{_qid}"]/..')
+                    records = vulnerabilities.get(_qid, [])
                     for record in records:
-                        url = record.findtext('URL')
-                        access_pass = [a.text for a in records[0].xpath('ACCESS_PATH/URL')]
-                        method = record.findtext('PAYLOADS/PAYLOAD/REQUEST/METHOD')
-                        if not method:
-                            logging.error("Bad record: %s", str(record))
-                            method = ""
-                        request = record.findtext('PAYLOADS/PAYLOAD/REQUEST/URL')
-                        response = record.findtext('PAYLOADS/PAYLOAD/RESPONSE/CONTENTS')
-                        response = html.escape(base64.b64decode(response).decode("utf-8", errors="ignore"))
-                        entrypoints.append(url)
+                        # Access path of the first record is used for all records of QID
+                        access_pass = records[0].access_path
+                        entrypoints.append(record.url)
                         entrypoints.extend(access_pass)
-                        references.append(f"{method.upper()}: {request}\n\nResponse: {response}\n\n")
+                        references.append(f"{record.method.upper()}: {record.request}\n\n"
+                                          f"Response: {record.response}\n\n")
                 for reference in references:
                     finding = Finding(title=f'{qid_title} - {qid_category}', tool="QualysWAS", cwe=cwe,
                                       description=description, test=test, severity=qid_severity,
@@ -75,3 +67,54 @@ class QualysWebAppParser(object):
                                       out_of_scope=False, mitigated=None, impact=qid_impact)
                     finding.unsaved_endpoints.extend(entrypoints)
                     self.items.append(finding)
+
+    @staticmethod
+    def index_report(file):
+        """
+        Reads report in one pass, records are indexed by QID and released right after reading
+
+        :return: (glossary QID elements, {QID: [VulnerabilityRecord]}, {QID: [information data]})
+        """
+        glossary = list()
+        vulnerabilities = dict()
+        information = dict()
+        context = etree.iterparse(
+            file, events=('end',), tag=('QID', 'VULNERABILITY', 'INFORMATION_GATHERED'),
+            remove_blank_text=True, no_network=True, recover=True
+        )
+        for _, item in context:
+            parent = item.getparent()
+            parent_tag = parent.tag if parent is not None else None
+            if item.tag == 'QID':
+                if parent_tag == 'QID_LIST' and parent.getparent() is not None \
+                        and parent.getparent().tag == 'GLOSSARY':
+                    glossary.append(item)
+                continue  # Glossary entries are kept, QIDs of records are read with records
+            if item.tag == 'VULNERABILITY' and parent_tag == 'VULNERABILITY_LIST':
+                _qid = item.findtext('QID')
+                method = item.findtext('PAYLOADS/PAYLOAD/REQUEST/METHOD')
+                if not method:
+                    logging.error("Bad record: %s", str(item))
+                    method = ""
+                response = item.findtext('PAYLOADS/PAYLOAD/RESPONSE/CONTENTS')
+                records = vulnerabilities.setdefault(_qid, [])
+                records.append(VulnerabilityRecord(
+                    item.findtext('URL'), method, item.findtext('PAYLOADS/PAYLOAD/REQUEST/URL'),
+                    html.escape(base64.b64decode(response).decode("utf-8", errors="ignore")),
+                    [a.text for a in item.xpath('ACCESS_PATH/URL')] if not records else None
+                ))
+            elif item.tag == 'INFORMATION_GATHERED' and parent_tag == 'INFORMATION_GATHERED_LIST':
+                information.setdefault(item.findtext('QID'), []).append(
+                    html.escape(base64.b64decode(item.findtext('DATA')).decode("utf-8", errors="ignore"))
+                )
+            else:
+                continue
+            item.clear()
+            while item.getprevious() is not None:
+                del parent[0]
+        del context
+        return glossary, vulnerabilities, information
+
+
+# Data of VULNERABILITY record, access path is stored for the first record of QID only
+VulnerabilityRecord = namedtuple("VulnerabilityRecord", ["url", "method", "request", "response", "access_path"])
@@ -15,25 +15,31 @@
 
 import json
 import os
-import re
-import requests
-from bs4 import BeautifulSoup
 from distutils.version import LooseVersion
 from dusty import constants
 from dusty.data_model.canonical_model import DefaultModel as Finding
+from dusty.drivers.nvd import make_nvd_enricher
 
 
 __author__ = 'KarynaTaranova'
 
 
 class RetireScanParser(object):
-    def __init__(self, filename, test, deps):
+    def __init__(self, filename, test, deps, enricher=None):
         dupes = dict()
         find_date = None
         self.items = []
         if not os.path.exists(filename):
             return
         data = json.load(open(filename))['data']
+        enricher = enricher if enricher else make_nvd_enricher()
+        enricher.prefetch(
+            reference
+            for file_results in data for version_results in file_results.get('results')
+            if version_results.get('component') in deps
+            for vulnerability in version_results.get('vulnerabilities', [])
+            for reference in vulnerability.get('info') if constants.NVD_URL in reference
+        )
         components_data = {}
         for file_results in data:
             file_path = file_results.get('file')
@@ -55,20 +61,15 @@ class RetireScanParser(object):
                             if reference not in components_data[component]['references']:
                                 components_data[component]['references'][summary].add(reference)
                                 if constants.NVD_URL in reference:
-                                    url_text = requests.get(reference).text
-                                    soup = BeautifulSoup(url_text, 'html.parser')
-                                    recomendation = soup.find_all('a', {'id': 'showCPERanges'})
-                                    if recomendation:
-                                        ver_res = re.findall('versions up to \(excluding\)(.*)',
-                                                             recomendation[0].attrs['data-range-description'])
-                                        if ver_res:
-                                            ver = ver_res[0].strip()
-                                            if (LooseVersion(components_data[component]['version_to_update'])
-                                                    < LooseVersion(ver)):
-                                                components_data[component]['version_to_update'] = ver
-                                    description = soup.find_all('p', {'data-testid': 'vuln-description'})
-                                    if description:
-                                        components_data[component]['descriptions'][summary] = description[0].text
+                                    nvd_record = enricher.get(reference)
+                                    ver = nvd_record['fix_version']
+                                    if ver:
+                                        if (LooseVersion(components_data[component]['version_to_update'])
+                                                < LooseVersion(ver)):
+                                            components_data[component]['version_to_update'] = ver
+                                    if nvd_record['description']:
+                                        components_data[component]['descriptions'][summary] = \
+                                            nvd_record['description']
                         cur_severity = vulnerability.get('severity').title()
                         if constants.SEVERITIES.get(components_data[component]['severity']) \
                                 > constants.SEVERITIES.get(cur_severity):
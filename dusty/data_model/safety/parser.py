@@ -30,7 +30,8 @@ class SafetyScanParser(object):
         self.items = []
         if not os.path.exists(filename):
             return
-        data = json.load(open(filename))
+        with open(filename, encoding="utf-8", errors="ignore") as f:
+            data = json.load(f)
         for vulnerability in data:
             package = vulnerability[0]
             affected = vulnerability[1]
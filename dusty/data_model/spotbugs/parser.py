@@ -17,9 +17,9 @@ import logging
 import hashlib
 
 from dusty.data_model.canonical_model import DefaultModel as Finding
+from dusty.data_model.markup import md, markdown_cache
 from dusty.constants import SEVERITY_TYPE
 from lxml import etree
-from markdownify import markdownify as md
 from xml.sax import saxutils
 
 
@@ -95,6 +95,7 @@ class SpotbugsParser:
 
         self.items = dupes.values()
 
+        markdown_cache.log_stats()
         logging.debug("Spotbugs output parsing done")
 
     def extract_bugs_details(self):
@@ -25,86 +25,136 @@ import json
 import html
 
 from collections import namedtuple
-from markdownify import markdownify as md
+from urllib.parse import urlparse
 
 from dusty import constants as c
-from dusty.data_model.canonical_model import Endpoint, DefaultModel as Finding
+from dusty.data_model.canonical_model import make_endpoint, DefaultModel as Finding
+from dusty.data_model.markup import md, md_table_escape, markdown_cache
 
 
 class ZapJsonParser(object):
     """ Parses ZAP json report and populates finding list """
 
     def __init__(self, zap_result, tool_name):
-        zap_json = json.loads(zap_result)
-        # Populate items
-        self.items = list()
-        for site in zap_json["site"]:
-            for alert in site["alerts"]:
-                description = list()
-                if "desc" in alert:
-                    description.append(md(alert["desc"]))
-                if "solution" in alert:
-                    description.append(f'**Solution**:\n {md(alert["solution"])}')
-                if "reference" in alert:
-                    description.append(f'**Reference**:\n {md(alert["reference"])}')
-                if "otherinfo" in alert:
-                    description.append(f'**Other information**:\n {md(alert["otherinfo"])}')
-                description.append(f'**Confidence**: {md(c.ZAP_CONFIDENCES[alert["confidence"]])}')
-                description = "\n".join(description)
-                instances = list()
-                if alert["instances"]:
-                    instances.append("\n")
-                    instances.append("| URI | Method | Parameter | Attack | Evidence |")
-                    instances.append("| --- | ------ | --------- | ------ | -------- |")
-                for item in alert["instances"]:
-                    instances.append("| {} |".format(" | ".join([
-                        html.escape(md_table_escape(item.get("uri", "-"))),
-                        html.escape(md_table_escape(item.get("method", "-"))),
-                        html.escape(md_table_escape(item.get("param", "-"))),
-                        html.escape(md_table_escape(item.get("attack", "-"))),
-                        html.escape(md_table_escape(item.get("evidence", "-")))
-                    ])))
-                finding = Finding(
-                    title=alert["name"],
-                    url=site["@name"],
-                    description=description,
-                    payload="\n".join(instances),
-                    tool=tool_name,
-                    test=tool_name,
-                    severity=c.ZAP_SEVERITIES[alert["riskcode"]],
-                    active=False,
-                    verified=False,
-                    dynamic_finding=True,
-                    numerical_severity=Finding.get_numerical_severity(
-                        c.ZAP_SEVERITIES[alert["riskcode"]]
-                    )
-                )
-                finding.unsaved_endpoints = list()
-                added_endpoints = set()
-                for item in alert["instances"]:
-                    if not item.get("uri", None):
-                        continue
-                    endpoint = make_endpoint_from_url(
-                        item.get("uri"),
-                        include_query=False, include_fragment=False
-                    )
-                    if str(endpoint) in added_endpoints:
-                        continue
-                    finding.unsaved_endpoints.append(endpoint)
-                    added_endpoints.add(str(endpoint))
-                self.items.append(finding)
-
-
-def md_table_escape(string):
-    """ Escape markdown special symbols """
-    to_escape = [
-        "\\", "`", "*", "_",
-        "{", "}", "[", "]", "(", ")",
-        "#", "|", "+", "-", ".", "!"
-    ]
-    for item in to_escape:
-        string = string.replace(item, f"\\{item}")
-    return string.replace("\n", " ")
+        self.items = list(iter_report_findings(json.loads(zap_result), tool_name))
+
+
+class ZapApiParser(object):
+    """ Pages alerts through ZAP API, items are produced lazily """
+
+    def __init__(self, zap_api, tool_name, page_size=c.ZAP_ALERTS_PAGE_SIZE):
+        self.items = iter_api_findings(zap_api, tool_name, page_size)
+
+
+def iter_report_findings(zap_json, tool_name):
+    """ Yields findings from parsed ZAP json report """
+    for site in zap_json["site"]:
+        for alert in site["alerts"]:
+            yield make_finding(site["@name"], alert, tool_name)
+    markdown_cache.log_stats()
+
+
+def iter_api_alerts(zap_api, page_size=c.ZAP_ALERTS_PAGE_SIZE, baseurl=None):
+    """ Yields raw alerts from ZAP API page by page """
+    start = 0
+    while True:
+        page = zap_api.core.alerts(baseurl=baseurl, start=str(start), count=str(page_size))
+        if not page:
+            return
+        yield from page
+        start += len(page)
+
+
+def iter_api_findings(zap_api, tool_name, page_size=c.ZAP_ALERTS_PAGE_SIZE, baseurl=None):
+    """
+    Yields findings from alerts paged through ZAP API
+
+    API returns one alert per instance, instances are grouped per site and rule (same as in json report).
+    Alerts are requested site by site and findings of a site are yielded as soon as its alerts are paged
+    through, so memory is bounded by compact instance rows of one site, not by all alerts of the scan
+    """
+    seen = set()
+    for site_url in [baseurl] if baseurl else zap_api.core.sites:
+        groups = dict()
+        for item in iter_api_alerts(zap_api, page_size, site_url):
+            # baseurl is a prefix filter, alerts of overlapping sites are only taken once
+            if "id" in item:
+                if item["id"] in seen:
+                    continue
+                seen.add(item["id"])
+            site = "{0.scheme}://{0.netloc}".format(urlparse(item.get("url", "")))
+            key = (site, item.get("pluginId"), item.get("alert"), item.get("risk"), item.get("confidence"))
+            if key not in groups:
+                alert = {
+                    "name": item.get("alert", item.get("name", "")),
+                    "riskcode": c.ZAP_RISK_CODES.get(item.get("risk"), "0"),
+                    "confidence": c.ZAP_CONFIDENCE_CODES.get(item.get("confidence"), "1"),
+                    "instances": list()
+                }
+                for report_field, api_field in [("desc", "description"), ("solution", "solution"),
+                                                ("reference", "reference"), ("otherinfo", "other")]:
+                    if item.get(api_field):
+                        alert[report_field] = item[api_field]
+                groups[key] = (site, alert)
+            instance = {"uri": item.get("url", "")}
+            for field in ["method", "param", "attack", "evidence"]:
+                if item.get(field):
+                    instance[field] = item[field]
+            groups[key][1]["instances"].append(instance)
+        for site, alert in groups.values():
+            yield make_finding(site, alert, tool_name)
+    markdown_cache.log_stats()
+
+
+def make_finding(site_name, alert, tool_name):
+    """ Makes Finding from json report alert """
+    description = list()
+    if "desc" in alert:
+        description.append(md(alert["desc"]))
+    if "solution" in alert:
+        description.append(f'**Solution**:\n {md(alert["solution"])}')
+    if "reference" in alert:
+        description.append(f'**Reference**:\n {md(alert["reference"])}')
+    if "otherinfo" in alert:
+        description.append(f'**Other information**:\n {md(alert["otherinfo"])}')
+    description.append(f'**Confidence**: {md(c.ZAP_CONFIDENCES[alert["confidence"]])}')
+    description = "\n".join(description)
+    instances = list()
+    if alert["instances"]:
+        instances.append("\n")
+        instances.append("| URI | Method | Parameter | Attack | Evidence |")
+        instances.append("| --- | ------ | --------- | ------ | -------- |")
+    for item in alert["instances"]:
+        instances.append("| {} |".format(" | ".join([
+            html.escape(md_table_escape(item.get("uri", "-"))),
+            html.escape(md_table_escape(item.get("method", "-"))),
+            html.escape(md_table_escape(item.get("param", "-"))),
+            html.escape(md_table_escape(item.get("attack", "-"))),
+            html.escape(md_table_escape(item.get("evidence", "-")))
+        ])))
+    finding = Finding(
+        title=alert["name"],
+        url=site_name,
+        description=description,
+        payload="\n".join(instances),
+        tool=tool_name,
+        test=tool_name,
+        severity=c.ZAP_SEVERITIES[alert["riskcode"]],
+        active=False,
+        verified=False,
+        dynamic_finding=True,
+        numerical_severity=Finding.get_numerical_severity(
+            c.ZAP_SEVERITIES[alert["riskcode"]]
+        )
+    )
+    finding.unsaved_endpoints = list(dict.fromkeys(
+        make_endpoint_from_url(
+            item.get("uri"),
+            include_query=False, include_fragment=False
+        )
+        for item in alert["instances"] if item.get("uri", None)
+    ))
+    return finding
 
 
 def make_endpoint_from_url(url, include_query=True, include_fragment=True):
@@ -116,7 +166,7 @@ def make_endpoint_from_url(url, include_query=True, include_fragment=True):
     if (protocol == "http" and port != "80") or (
             protocol == "https" and port != "443"):
         host_value = f'{parsed_url.hostname}:{parsed_url.port}'
-    return Endpoint(
+    return make_endpoint(
         protocol=parsed_url.protocol,
         host=host_value,
         fqdn=parsed_url.hostname,
@@ -1,28 +1,102 @@
 import os
+import re
 import logging
-from copy import deepcopy
-from jira import JIRA
+import threading
+from time import sleep, monotonic
+from contextlib import contextmanager
+from jira import JIRA, JIRAError
+from requests.adapters import HTTPAdapter
 from traceback import format_exc
 from dusty import constants as const
+from dusty.cache import DiskCache
+
+
+class RateLimiter(object):
+    """ Token bucket limiting number of requests per second """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst) if burst else max(self.rate, 1.0)
+        self.tokens = self.capacity
+        self.timestamp = monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.timestamp) * self.rate)
+                self.timestamp = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            sleep(delay)
+
+
+class FieldTemplate(object):
+    """ Field value with !default_* placeholders split once for fast rendering """
+
+    PLACEHOLDERS = ['!default_issuetype', '!default_summary', '!default_description', '!default_priority']
+    PLACEHOLDER_PATTERN = re.compile("({})".format("|".join(re.escape(item) for item in PLACEHOLDERS)))
+
+    def __init__(self, value):
+        self.parts = self.PLACEHOLDER_PATTERN.split(value)
+
+    def render(self, defaults):
+        # Odd parts are placeholders captured by split()
+        return "".join(defaults[part] if index % 2 else part for index, part in enumerate(self.parts))
+
+    @classmethod
+    def compile(cls, value):
+        if isinstance(value, str) and const.JIRA_FIELD_USE_DEFAULT_VALUE in value \
+                and cls.PLACEHOLDER_PATTERN.search(value):
+            return cls(value)
+        return value
+
+    @staticmethod
+    def apply(value, defaults):
+        return value.render(defaults) if isinstance(value, FieldTemplate) else value
 
 
 class JiraWrapper(object):
     JIRA_REQUEST = 'project={} AND (description ~ "{}" OR labels in ({}))'
+    JIRA_BULK_REQUEST = 'project={} AND ({} OR labels in ({}))'
+    ISSUE_HASH_PATTERN = re.compile(r'[0-9a-f]{64}')
 
-    def __init__(self, url, user, password, project, fields=None):
+    def __init__(self, url, user, password, project, fields=None, max_workers=1, rate_limit=None,
+                 metadata_cache_ttl=None, invalidate_metadata_cache=False):
         self.valid = True
         self.url = url
         self.password = password
         self.user = user
+        self.max_workers = max(int(max_workers or 1), 1)
+        self.rate_limit = rate_limit
+        self._client = None
+        self.connections_opened = 0
+        self.connections_reused = 0
+        self.client_lock = threading.Lock()
+        self.rate_limiter = RateLimiter(self.rate_limit) if self.rate_limit else None
+        self.local = threading.local()
+        self.hash_locks = dict()
+        self.hash_locks_guard = threading.Lock()
+        # Wrapper is shared by concurrently running scanners
+        self.index_lock = threading.Lock()
+        self.tickets_lock = threading.Lock()
+        self.metadata_cache = DiskCache("jira", ttl=const.JIRA_METADATA_CACHE_TTL
+                                        if metadata_cache_ttl is None else metadata_cache_ttl)
+        if invalidate_metadata_cache:
+            self.metadata_cache.invalidate()
         try:
             self.connect()
         except:
             self.valid = False
             return
-        self.projects = [project.key for project in self.client.projects()]
+        self.projects = self.get_metadata(
+            "projects", lambda: [project.key for project in self.client.projects()])
         self.project = project.upper()
         if self.project not in self.projects:
-            self.client.close()
+            self.close()
             self.valid = False
             return
         self.fields = {}
@@ -30,15 +104,19 @@ class JiraWrapper(object):
         if isinstance(fields, dict):
             if 'watchers' in fields.keys():
                 self.watchers = [item.strip() for item in fields.pop('watchers').split(",")]
-            all_jira_fields = self.client.fields()
+            all_jira_fields = self.get_metadata("fields", self.client.fields)
+            fields_by_id = dict()
+            fields_by_name = dict()
+            for item in all_jira_fields:
+                fields_by_id.setdefault(item["id"], list()).append(item)
+                fields_by_name.setdefault(item["name"].lower(), list()).append(item)
             for key, value in fields.items():
                 if value:
                     if isinstance(value, str) and const.JIRA_FIELD_DO_NOT_USE_VALUE in value:
                         continue
-                    jira_keys = [item for item in all_jira_fields if item["id"] == key]
+                    jira_keys = fields_by_id.get(key, None)
                     if not jira_keys:
-                        jira_keys = [item for item in all_jira_fields
-                                     if item["name"].lower() == key.lower().replace('_', ' ')]
+                        jira_keys = fields_by_name.get(key.lower().replace('_', ' '), list())
                     if len(jira_keys) == 1:
                         jira_key = jira_keys[0]
                         key_type = jira_key['schema']['type']
@@ -57,25 +135,108 @@ class JiraWrapper(object):
                     self.fields[jira_key['id']] = _value
         if not self.fields.get('issuetype', None):
             self.fields['issuetype'] = {'name': '!default_issuetype'}
-        self.client.close()
+        self.issue_template = self.compile_issue_template(self.fields)
         self.created_jira_tickets = list()
+        self.issues_index = dict()
+
+    def __deepcopy__(self, memo):
+        # Single wrapper (and Jira session) is shared by all scanners of the run
+        return self
+
+    def call(self, method, *args, **kwargs):
+        """ Call Jira client method with rate limiting and retries on 429/5xx responses """
+        for attempt in range(const.JIRA_MAX_RETRIES + 1):
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            try:
+                return method(*args, **kwargs)
+            except JIRAError as e:
+                status_code = e.status_code or 0
+                if attempt == const.JIRA_MAX_RETRIES or not (status_code == 429 or status_code >= 500):
+                    raise
+                delay = const.JIRA_RETRY_BACKOFF * 2 ** attempt
+                if e.response is not None and e.response.headers.get("Retry-After", "").isdigit():
+                    delay = max(delay, int(e.response.headers["Retry-After"]))
+                logging.warning("Jira responded with %d, retrying in %d seconds", status_code, delay)
+                sleep(delay)
+
+    def get_hash_lock(self, issue_hash):
+        with self.hash_locks_guard:
+            return self.hash_locks.setdefault(issue_hash, threading.Lock())
+
+    @contextmanager
+    def collect_created_tickets(self, tickets=None):
+        """ Collect tickets created in current thread into list instead of adding them to shared one """
+        previous = getattr(self.local, "tickets", None)
+        self.local.tickets = list() if tickets is None else tickets
+        try:
+            yield self.local.tickets
+        finally:
+            self.local.tickets = previous
+
+    def add_created_tickets(self, tickets):
+        """ Adds tickets as a contiguous block to list collected by current thread or to shared one """
+        collected = getattr(self.local, "tickets", None)
+        if collected is not None:
+            collected.extend(tickets)
+            return
+        with self.tickets_lock:
+            self.created_jira_tickets.extend(tickets)
+
+    def get_metadata(self, name, factory, *key):
+        """ Returns Jira metadata from disk cache, fetches and caches it on miss """
+        return self.metadata_cache.get_or_set([self.url, self.user, name] + list(key), factory)
 
     def connect(self):
-        self.client = JIRA(self.url, basic_auth=(self.user, self.password))
+        """ Returns shared Jira client, creating it on first use """
+        with self.client_lock:
+            if self._client is None:
+                # Retries (with Retry-After and rate limiting) are done by call()
+                self._client = JIRA(self.url, basic_auth=(self.user, self.password), max_retries=0)
+                # Keep enough pooled connections for concurrent writers
+                adapter = HTTPAdapter(pool_maxsize=max(self.max_workers, const.JIRA_MIN_POOL_SIZE))
+                self._client._session.mount("http://", adapter)
+                self._client._session.mount("https://", adapter)
+                self.connections_opened += 1
+            else:
+                self.connections_reused += 1
+            return self._client
+
+    @property
+    def client(self):
+        return self._client if self._client is not None else self.connect()
+
+    def close(self):
+        """ Closes shared Jira client at the end of the run """
+        with self.client_lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+        logging.debug("Jira connections opened: %d, reused: %d", self.connections_opened, self.connections_reused)
 
     def markdown_to_jira_markdown(self, content):
         return content.replace("###", "h3.").replace("**", "*")
 
+    @staticmethod
+    def compile_issue_template(fields):
+        """ Pre-process configured fields into (key, kind, value) operations applied to every issue """
+        template = list()
+        for key, value in fields.items():
+            if isinstance(value, str):
+                if const.JIRA_FIELD_DO_NOT_USE_VALUE in value:
+                    template.append((key, "remove", None))
+                else:
+                    template.append((key, "str", FieldTemplate.compile(value)))
+            elif isinstance(value, list):
+                template.append((key, "list", [FieldTemplate.compile(item) for item in value]))
+            elif isinstance(value, dict):
+                template.append((key, "dict", {_key: FieldTemplate.compile(_value) for _key, _value in value.items()}))
+            else:
+                template.append((key, "value", value))
+        return template
+
     def create_issue(self, title, priority, description, issue_hash, attachments=None, get_or_create=True,
                      additional_labels=None):
-
-        def replace_defaults(value):
-            if isinstance(value, str) and const.JIRA_FIELD_USE_DEFAULT_VALUE in value:
-                for default_key in default_fields.keys():
-                    if default_key in value:
-                        value = value.replace(default_key, default_fields[default_key])
-            return value
-
         default_fields = {
             '!default_issuetype': 'Bug',
             '!default_summary': title,
@@ -89,24 +250,19 @@ class JiraWrapper(object):
             'description': description,
             'priority': {'name': priority}
         }
-        fields = deepcopy(self.fields)
-        for key, value in fields.items():
-            if isinstance(value, str):
-                if const.JIRA_FIELD_DO_NOT_USE_VALUE in value:
-                    issue_data.pop(key)
-                else:
-                    issue_data[key] = replace_defaults(value)
-            elif isinstance(value, list):
-                for item in value:
-                    value[value.index(item)] = replace_defaults(item)
+        for key, kind, value in self.issue_template:
+            if kind == "remove":
+                issue_data.pop(key, None)
+            elif kind == "str":
+                issue_data[key] = FieldTemplate.apply(value, default_fields)
+            elif kind == "list":
+                value = [FieldTemplate.apply(item, default_fields) for item in value]
                 if issue_data.get(key):
                     issue_data[key].extend(value)
                 else:
                     issue_data[key] = value
-            elif isinstance(value, dict):
-                for _key, _value in value.items():
-                    value[_key] = replace_defaults(_value)
-                issue_data[key] = value
+            elif kind == "dict":
+                issue_data[key] = {_key: FieldTemplate.apply(_value, default_fields) for _key, _value in value.items()}
             elif not key in issue_data:
                 issue_data[key] = value
             else:
@@ -120,7 +276,8 @@ class JiraWrapper(object):
             issue_data['labels'] = _labels
         jira_request = self.JIRA_REQUEST.format(issue_data["project"]["key"], issue_hash, issue_hash)
         if get_or_create:
-            issue, created = self.get_or_create_issue(jira_request, issue_data)
+            with self.get_hash_lock(issue_hash):
+                issue, created = self.get_or_create_issue(jira_request, issue_data, issue_hash)
         else:
             issue = self.post_issue(issue_data)
             created = True
@@ -132,37 +289,63 @@ class JiraWrapper(object):
                                             attachment=attachment['binary_content'],
                                             filename=attachment['message'])
             for watcher in self.watchers:
-                self.client.add_watcher(issue.id, watcher)
+                self.call(self.client.add_watcher, issue.id, watcher)
         except:
             if os.environ.get("debug", False):
                 logging.error(format_exc())
         finally:
-            self.created_jira_tickets.append({'description': issue.fields.summary,
-                                              'priority': issue.fields.priority,
-                                              'key': issue.key,
-                                              'link': self.url + '/browse/' + issue.key,
-                                              'new': created,
-                                              'assignee': issue.fields.assignee,
-                                              'status': issue.fields.status.name,
-                                              'open_date': issue.fields.created})
+            self.add_created_tickets([{'description': issue.fields.summary,
+                                       'priority': issue.fields.priority,
+                                       'key': issue.key,
+                                       'link': self.url + '/browse/' + issue.key,
+                                       'new': created,
+                                       'assignee': issue.fields.assignee,
+                                       'status': issue.fields.status.name,
+                                       'open_date': issue.fields.created}])
         return issue, created
 
     def add_attachment(self, issue_key, attachment, filename=None):
-        issue = self.client.issue(issue_key)
+        issue = self.call(self.client.issue, issue_key)
         for _ in issue.fields.attachment:
             if _.filename == filename:
                 return
-        self.client.add_attachment(issue, attachment, filename)
+        self.call(self.client.add_attachment, issue, attachment, filename)
 
     def post_issue(self, issue_data):
-        issue = self.client.create_issue(fields=issue_data)
+        issue = self.call(self.client.create_issue, fields=issue_data)
         logging.info(f'  \u2713 {issue_data["issuetype"]["name"]} was created: {issue.key}')
         return issue
 
-    def get_or_create_issue(self, search_string, issue_data):
+    def prefetch_issues(self, issue_hashes):
+        """ Find existing issues for all hashes with few bulk queries and index them by hash """
+        with self.index_lock:
+            hashes = [item for item in dict.fromkeys(issue_hashes) if item not in self.issues_index]
+        for index in range(0, len(hashes), const.JIRA_BULK_SEARCH_SIZE):
+            chunk = hashes[index:index + const.JIRA_BULK_SEARCH_SIZE]
+            jira_request = self.JIRA_BULK_REQUEST.format(
+                self.project, " OR ".join(f'description ~ "{item}"' for item in chunk), ", ".join(chunk))
+            chunk_index = {item: list() for item in chunk}
+            for issue in self.call(self.client.search_issues, jira_request, maxResults=False):
+                found_hashes = set(self.ISSUE_HASH_PATTERN.findall(issue.fields.description or ""))
+                found_hashes.update(issue.fields.labels or [])
+                for issue_hash in found_hashes:
+                    if issue_hash in chunk_index:
+                        chunk_index[issue_hash].append(issue)
+            with self.index_lock:
+                # Merge, other scanners may have indexed issues they created meanwhile
+                for issue_hash, issues in chunk_index.items():
+                    indexed = self.issues_index.setdefault(issue_hash, list())
+                    known = {issue.key for issue in indexed}
+                    indexed.extend(issue for issue in issues if issue.key not in known)
+        logging.debug("Prefetched Jira issues for %d hashes", len(hashes))
+
+    def get_or_create_issue(self, search_string, issue_data, issue_hash=None):
         issuetype = issue_data['issuetype']
         created = False
-        jira_results = self.client.search_issues(search_string)
+        with self.index_lock:
+            jira_results = list(self.issues_index[issue_hash]) if issue_hash in self.issues_index else None
+        if jira_results is None:
+            jira_results = self.call(self.client.search_issues, search_string)
         issues = []
         for each in jira_results:
             if each.fields.summary == issue_data.get('summary', None):
@@ -176,12 +359,16 @@ class JiraWrapper(object):
         else:
             issue = self.post_issue(issue_data)
             created = True
+            with self.index_lock:
+                if issue_hash in self.issues_index:
+                    self.issues_index[issue_hash].append(issue)
         return issue, created
 
     def add_comment_to_issue(self, issue, data):
-        return self.client.add_comment(issue, data)
+        return self.call(self.client.add_comment, issue, data)
 
     def get_created_tickets(self):
-        return self.created_jira_tickets
+        with self.tickets_lock:
+            return list(self.created_jira_tickets)
 
 
@@ -0,0 +1,188 @@
+#   Copyright 2019 getcarrier.io
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+    NVD enrichment for composition analysis findings (fix version and description by CVE)
+"""
+
+import os
+import re
+import gzip
+import json
+import logging
+import requests
+
+from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from dusty import constants as c
+from dusty.cache import DiskCache
+
+
+FIX_VERSION_PATTERN = re.compile(r'versions up to \(excluding\)(.*)')
+
+
+def empty_record():
+    return {"fix_version": None, "description": None}
+
+
+def has_details(record):
+    """ Empty records are not cached, they may come from failed or rate limited lookups """
+    return bool(record and (record.get("fix_version") or record.get("description")))
+
+
+class NvdWebSource(object):
+    """ Scrapes CVE details pages from NVD website """
+
+    def __init__(self, timeout=c.NVD_REQUEST_TIMEOUT):
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def fetch(self, cve_id):
+        response = self.session.get(f"{c.NVD_URL}{cve_id}", timeout=self.timeout)
+        response.raise_for_status()
+        soup = BeautifulSoup(response.text, 'html.parser')
+        record = empty_record()
+        recomendation = soup.find_all('a', {'id': 'showCPERanges'})
+        if recomendation:
+            ver_res = FIX_VERSION_PATTERN.findall(recomendation[0].attrs['data-range-description'])
+            if ver_res:
+                record["fix_version"] = ver_res[0].strip()
+        description = soup.find_all('p', {'data-testid': 'vuln-description'})
+        if description:
+            record["description"] = description[0].text
+        return record
+
+
+class NvdFeedSource(object):
+    """ Reads CVE details from local mirror of NVD JSON feeds (nvdcve-1.1-*.json[.gz]), no network access """
+
+    def __init__(self, feed_path):
+        self.feed_path = feed_path
+        self.records = None
+
+    def _feed_files(self):
+        if os.path.isfile(self.feed_path):
+            return [self.feed_path]
+        return sorted(
+            os.path.join(self.feed_path, name) for name in os.listdir(self.feed_path)
+            if name.endswith(".json") or name.endswith(".json.gz")
+        )
+
+    @staticmethod
+    def _fix_version(nodes):
+        for node in nodes:
+            for match in node.get("cpe_match", []):
+                if match.get("versionEndExcluding"):
+                    return match["versionEndExcluding"]
+            version = NvdFeedSource._fix_version(node.get("children", []))
+            if version:
+                return version
+        return None
+
+    def load(self, cve_ids=None):
+        """ Indexes feed items, only requested CVEs are kept if cve_ids are given """
+        self.records = dict()
+        wanted = set(cve_ids) if cve_ids is not None else None
+        for feed_file in self._feed_files():
+            opener = gzip.open if feed_file.endswith(".gz") else open
+            with opener(feed_file, "rt", encoding="utf-8") as f:
+                feed = json.load(f)
+            for item in feed.get("CVE_Items", []):
+                cve_id = item["cve"]["CVE_data_meta"]["ID"]
+                if wanted is not None and cve_id not in wanted:
+                    continue
+                record = empty_record()
+                record["fix_version"] = self._fix_version(item.get("configurations", {}).get("nodes", []))
+                for description in item["cve"].get("description", {}).get("description_data", []):
+                    if description.get("lang") == "en":
+                        record["description"] = description.get("value")
+                        break
+                self.records[cve_id] = record
+            del feed
+        logging.debug("Loaded %d CVE records from NVD feed %s", len(self.records), self.feed_path)
+
+    def fetch(self, cve_id):
+        if self.records is None:
+            self.load()
+        return self.records.get(cve_id, empty_record())
+
+
+class NvdEnricher(object):
+    """ Looks up CVE details through a source (cache only if source is None), results are cached per CVE """
+
+    def __init__(self, source, cache=None, max_workers=c.NVD_MAX_WORKERS):
+        self.source = source
+        self.cache = cache
+        self.max_workers = max(int(max_workers), 1)
+        self.records = dict()
+
+    @staticmethod
+    def cve_id(reference):
+        """ Returns CVE ID from NVD reference URL """
+        return reference.split(c.NVD_URL, 1)[-1].strip().strip("/")
+
+    def _lookup(self, cve_id):
+        try:
+            if self.source is None:
+                cached = self.cache.get(cve_id) if self.cache is not None else None
+                return cached if cached else empty_record()
+            if self.cache is None:
+                return self.source.fetch(cve_id)
+            return self.cache.get_or_set(cve_id, lambda: self.source.fetch(cve_id), has_details)
+        except (requests.RequestException, OSError, ValueError):
+            logging.warning("Failed to get NVD details for %s", cve_id)
+            return empty_record()
+
+    def prefetch(self, references):
+        """ Looks up all unique CVEs concurrently """
+        cve_ids = sorted(set(self.cve_id(reference) for reference in references) - set(self.records))
+        if not cve_ids:
+            return
+        if isinstance(self.source, NvdFeedSource) and self.source.records is None:
+            self.source.load(cve_ids)
+        logging.info("Getting NVD details for %d CVEs", len(cve_ids))
+        if self.max_workers == 1:
+            records = [self._lookup(cve_id) for cve_id in cve_ids]
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                records = list(executor.map(self._lookup, cve_ids))
+        self.records.update(zip(cve_ids, records))
+
+    def get(self, reference):
+        """ Returns {'fix_version': ..., 'description': ...} for NVD reference URL """
+        cve_id = self.cve_id(reference)
+        if cve_id not in self.records:
+            self.records[cve_id] = self._lookup(cve_id)
+        return self.records[cve_id]
+
+
+def make_nvd_enricher(nvd_config=None):
+    """
+    Creates enricher from composition_analysis.nvd config section
+
+    :param nvd_config: dict with feed_path (local NVD JSON feeds), offline (no network calls),
+                       cache_ttl, cache_path, timeout and max_workers
+    """
+    nvd_config = nvd_config if isinstance(nvd_config, dict) else dict()
+    feed_path = nvd_config.get("feed_path", os.environ.get("nvd_feed_path", None))
+    cache = None
+    if feed_path:
+        source = NvdFeedSource(feed_path)  # Feed is local already, no need to cache
+    else:
+        cache = DiskCache("nvd", nvd_config.get("cache_ttl", None), nvd_config.get("cache_path", None))
+        if nvd_config.get("offline", False):
+            source = None  # Only previously cached records are used
+        else:
+            source = NvdWebSource(nvd_config.get("timeout", c.NVD_REQUEST_TIMEOUT))
+    return NvdEnricher(source, cache, nvd_config.get("max_workers", c.NVD_MAX_WORKERS))
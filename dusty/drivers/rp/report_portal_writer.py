@@ -12,14 +12,18 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
+import logging
 import traceback
+import threading
 
+from queue import Queue, Full
 from time import time
 from reportportal_client import ReportPortalServiceAsync as ReportPortalService
 
 from dusty import constants
 
 rp_service = None
+rp_service_lock = threading.Lock()
 
 
 def timestamp():
@@ -41,16 +45,24 @@ def launch_reportportal_service(rp_config):
         return None
     global rp_service
 
-    if not rp_service:
-        rp_service = ReportPortalDataWriter(endpoint=rp_config["rp_url"],
-                                            token=rp_config["rp_token"],
-                                            project=rp_config["rp_project"],
-                                            launch_name=rp_config["rp_launch_name"],
-                                            tags=rp_config["rp_launch_tags"])
-        rp_service.start_test()
+    with rp_service_lock:
+        if not rp_service:
+            rp_service = ReportPortalDataWriter(endpoint=rp_config["rp_url"],
+                                                token=rp_config["rp_token"],
+                                                project=rp_config["rp_project"],
+                                                launch_name=rp_config["rp_launch_name"],
+                                                tags=rp_config["rp_launch_tags"])
+            rp_service.start_test()
     return rp_service
 
 
+def finish_reportportal_service():
+    """ Publishes queued items and finishes launch if it is still running, e.g. when scanning failed """
+    with rp_service_lock:
+        if rp_service and rp_service.is_test_started():
+            rp_service.finish_test()
+
+
 class ReportPortalDataWriter:
     def __init__(self, endpoint, token, project, log_batch_size=100, launch_name=None, tags=None,
                  launch_doc=None, launch_id=None, verify_ssl=False):
@@ -65,6 +77,11 @@ class ReportPortalDataWriter:
         self.test = None
         self.verify_ssl = verify_ssl
         self.launch_id = launch_id
+        self.queue = None
+        self.publisher = None
+        self.published_items = 0
+        self.backpressure_events = 0
+        self.backpressure_lock = threading.Lock()
 
     def start_service(self):
         self.service = ReportPortalService(endpoint=self.endpoint,
@@ -74,6 +91,9 @@ class ReportPortalDataWriter:
                                            verify_ssl=self.verify_ssl)
         if self.launch_id:
             self.service.launch_id = self.launch_id
+        self.queue = Queue(maxsize=constants.RP_QUEUE_SIZE)
+        self.publisher = threading.Thread(target=self._publish_items, name="rp-publisher", daemon=True)
+        self.publisher.start()
 
     def start_test(self):
         if not self.service:
@@ -83,7 +103,51 @@ class ReportPortalDataWriter:
                                          description=self.launch_doc,
                                          tags=self.tags)
 
+    def publish_item(self, name, description, tags, messages):
+        """
+        Queue test item for publishing off the calling thread
+
+        :param messages: list of (message, level, attachment) tuples
+        """
+        item = (name, description, tags, messages, timestamp())
+        try:
+            self.queue.put_nowait(item)
+        except Full:
+            with self.backpressure_lock:
+                if not self.backpressure_events:
+                    logging.warning("ReportPortal publisher queue is full, reporting is slowed down")
+                self.backpressure_events += 1
+            self.queue.put(item)
+
+    def _publish_items(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            name, description, tags, messages, item_time = item
+            try:
+                self.service.start_test_item(name, description=description, tags=tags,
+                                             start_time=item_time, item_type='STEP', parameters={})
+                for message, level, attachment in messages:
+                    for index in range(0, max(len(message), 1), constants.MAX_MESSAGE_LEN):
+                        self.service.log(time=item_time, message=message[index:index + constants.MAX_MESSAGE_LEN],
+                                         level=level, attachment=attachment)
+                self.service.finish_test_item(end_time=timestamp(), status="FAILED")
+                self.published_items += 1
+            except:  # pylint: disable=W0702
+                logging.exception("Failed to publish item to ReportPortal")
+
+    def flush(self):
+        """ Wait for all queued items to be published and stop publisher """
+        if self.publisher:
+            self.queue.put(None)
+            self.publisher.join()
+            self.publisher = None
+            logging.debug("ReportPortal: published %d items, publisher queue was full %d times",
+                          self.published_items, self.backpressure_events)
+
     def finish_test(self):
+        self.flush()
         self.service.finish_launch(end_time=timestamp())
         self.service.terminate()
         self.service = None
@@ -92,26 +156,3 @@ class ReportPortalDataWriter:
         if self.service:
             return True
         return False
-
-    def start_test_item(self, issue, description, tags, item_type='STEP', parameters={}):
-        self.service.start_test_item(issue, description=description,
-                                     tags=tags, start_time=timestamp(),
-                                     item_type=item_type, parameters=parameters)
-
-    def test_item_message(self, message, level="ERROR", attachment=None):
-        if len(message) > constants.MAX_MESSAGE_LEN:
-            index = 0
-            while index < len(message):
-                increment = constants.MAX_MESSAGE_LEN
-                if index + increment > len(message):
-                    increment = len(message) - index
-                self.service.log(time=timestamp(), message=message[index:index+increment],
-                                 level=level, attachment=attachment)
-                index = index+increment
-        else:
-            self.service.log(time=timestamp(), message=message,
-                             level=level, attachment=attachment)
-
-    def finish_test_item(self, status="FAILED"):
-        self.service.finish_test_item(end_time=timestamp(),
-                                      status=status)
@@ -18,65 +18,231 @@ import json
 import base64
 import urllib
 import logging
+import socket
 import subprocess
-import pkg_resources
+import threading
 from time import sleep, time
 from datetime import datetime
 from random import randrange
-from zapv2 import ZAPv2
+from concurrent.futures import ThreadPoolExecutor
 
 from dusty import constants as c
-from dusty.utils import execute, find_ip, common_post_processing, id_generator
-from dusty.data_model.nikto.parser import NiktoXMLParser
-from dusty.data_model.nmap.parser import NmapXMLParser
-from dusty.data_model.sslyze.parser import SslyzeJSONParser
-from dusty.data_model.masscan.parser import MasscanJSONParser
-from dusty.data_model.w3af.parser import W3AFXMLParser
-from dusty.data_model.qualys.parser import QualysWebAppParser
-from dusty.data_model.aemhacker.parser import AemOutputParser
-from dusty.data_model.zap.parser import ZapJsonParser
-from dusty.drivers.qualys import WAS
+from dusty.utils import execute, common_post_processing, id_generator, get_work_dir, \
+    execute_streaming
+from dusty.registry import get_tool, get_driver
+
+MASSCAN_TARGET = re.compile(r'^\d{1,3}(\.\d{1,3}){3}(/\d{1,2}|-\d{1,3}(\.\d{1,3}){3})?$')
+W3AF_OUTPUT_FILE = re.compile(r'^(\s*set\s+output_file\s+)\S+', re.MULTILINE)
+NMAP_REPORT_HOST = re.compile(r'Nmap scan report for (\S+)(?: \(([^)]+)\))?')
+NMAP_OPEN_PORT = re.compile(r'([0-9]+)/(tcp|udp)\s+open')
+# Per-host probes, -A is -O -sV -sC --traceroute
+NMAP_HOST_PROBES = {"-O", "--osscan-limit", "--osscan-guess", "--traceroute"}
+
+
+def shards_count(shards):
+    """ Number of parallel scanner processes, "auto" means one per CPU core """
+    if str(shards).lower() == "auto":
+        return os.cpu_count() or 1
+    return max(int(shards), 1)
+
+
+def masscan_targets(hosts):
+    """ Passes IPv4 addresses, CIDRs and ranges through and resolves host names to their IPv4 addresses """
+    if isinstance(hosts, str):
+        hosts = re.split(r'[,\s]+', hosts)
+    targets = list()
+    for host in hosts:
+        host = str(host).strip()
+        if not host:
+            continue
+        if MASSCAN_TARGET.match(host):
+            targets.append(host)
+            continue
+        try:
+            addresses = socket.getaddrinfo(host, None, socket.AF_INET, socket.SOCK_STREAM)
+        except socket.gaierror:
+            logging.warning("Failed to resolve %s, skipping it", host)
+            continue
+        targets.extend(address[4][0] for address in addresses)
+    return list(dict.fromkeys(targets))
+
+
+class MasscanRate(object):
+    """ Total packet rate of all masscan processes, adjusted by AIMD on transmit errors when adaptive """
+
+    def __init__(self, rate, adaptive=False, min_rate=c.MASSCAN_MIN_RATE, max_rate=c.MASSCAN_MAX_RATE,
+                 step=c.MASSCAN_RATE_STEP):
+        self.rate = int(rate)
+        self.adaptive = bool(adaptive)
+        self.min_rate = int(min_rate)
+        self.max_rate = max(int(max_rate), self.min_rate)
+        self.step = int(step)
+        self._lock = threading.Lock()
+
+    def per_process(self, processes):
+        with self._lock:
+            return max(self.rate // processes, 1)
+
+    def update(self, errors):
+        """ Halves rate after shard with transmit errors, otherwise raises it by step """
+        if not self.adaptive:
+            return
+        with self._lock:
+            if errors:
+                self.rate = max(self.rate // 2, self.min_rate)
+            else:
+                self.rate = min(self.rate + self.step, self.max_rate)
+            logging.info("masscan rate is %d pps (%d transmit errors in last shard)", self.rate, errors)
+
+
+def nmap_discovered_ports(output, targets=()):
+    """
+    Maps every host from nmap discovery output to its open (tcp, udp) ports
+
+    Hosts are keyed by address, unless the user configured them by name: nmap reports
+    reverse DNS name for configured addresses, scanning by it could reach another host
+    """
+    if isinstance(output, bytes):
+        output = output.decode("utf-8", errors="ignore")
+    hosts = dict()
+    ports = None
+    for line in output.splitlines():
+        match = NMAP_REPORT_HOST.match(line)
+        if match:
+            name, address = match.groups()
+            # Configured name is kept, so that http scripts still send the right Host header
+            host = name if address is None or name in targets else address
+            ports = hosts.setdefault(host, (list(), list()))
+            continue
+        match = NMAP_OPEN_PORT.match(line)
+        if match and ports is not None:
+            ports[0 if match.group(2) == "tcp" else 1].append(match.group(1))
+    return {host: ports for host, ports in hosts.items() if ports[0] or ports[1]}
+
+
+def nmap_shards(hosts, shards):
+    """
+    Splits discovered hosts and ports into service detection jobs
+
+    Every host gets its own job, when there are fewer hosts than shards their ports are
+    spread round-robin over several jobs, so that each shard gets a similar share of NSE work
+
+    :return: list of (host, tcp ports, udp ports) tuples
+    """
+    jobs = list()
+    if not hosts:
+        return jobs
+    per_host = max(shards // len(hosts), 1)
+    for host, (tcp_ports, udp_ports) in hosts.items():
+        host_ports = [("tcp", port) for port in tcp_ports] + [("udp", port) for port in udp_ports]
+        for index in range(min(per_host, len(host_ports))):
+            chunk = host_ports[index::per_host]
+            jobs.append((host,
+                         [port for protocol, port in chunk if protocol == "tcp"],
+                         [port for protocol, port in chunk if protocol == "udp"]))
+    return jobs
+
+
+def nmap_port_params(params):
+    """ Drops OS detection and traceroute from nmap params, keeping the rest of what -A enables """
+    result = list()
+    for param in params.split():
+        if param == "-A":
+            result.extend(["-sV", "-sC"])
+        elif param not in NMAP_HOST_PROBES:
+            result.append(param)
+    return " ".join(result)
+
+
+def nmap_sharded_scan(config, discovery_output, nse_scripts, shards):
+    """ Runs service detection in parallel nmap processes and parses their merged reports """
+    targets = re.split(r'[,\s]+', str(config["host"]))
+    jobs = nmap_shards(nmap_discovered_ports(discovery_output, targets), shards)
+    if not jobs:
+        return list()
+    spec = get_tool("nmap")
+    params = config.get("params", "-v -sVA")
+    # Host split over several jobs gets OS detection and traceroute only once
+    port_params = nmap_port_params(params)
+    work_dir = get_work_dir(config, "nmap")
+    commands = list()
+    report_paths = list()
+    probed_hosts = set()
+    for index, (host, tcp_ports, udp_ports) in enumerate(jobs):
+        ports = f"-pT:{','.join(tcp_ports)}" if tcp_ports else ""
+        ports += f" -pU:{','.join(udp_ports)}" if udp_ports else ""
+        report_path = spec.report_path(work_dir, index)
+        job_params = port_params if host in probed_hosts else params
+        probed_hosts.add(host)
+        commands.append(f'nmap {job_params} {ports} '
+                        f'--min-rate 1000 --max-retries 0 '
+                        f'--script={nse_scripts} {host} -oX {report_path}')
+        report_paths.append(report_path)
+    logging.info("Running nmap service detection in %d jobs over %d shards", len(jobs), shards)
+    with ThreadPoolExecutor(max_workers=min(shards, len(jobs))) as executor:
+        list(executor.map(execute, commands))
+    # Shard that failed to start or was interrupted leaves no (or broken) report behind
+    report_paths = [path for path in report_paths if os.path.exists(path) and os.path.getsize(path)]
+    return list(spec.get_parser()(report_paths, "NMAP").items)
 
 
 class DustyWrapper(object):
     @staticmethod
     def sslyze(config):
         tool_name = "SSlyze"
-        exec_cmd = f'sslyze --regular --json_out=/tmp/sslyze.json --quiet {config["host"]}:{config["port"]}'
+        spec = get_tool("sslyze")
+        report_path = spec.report_path(get_work_dir(config, spec.name))
+        exec_cmd = f'sslyze --regular --json_out={report_path} --quiet {config["host"]}:{config["port"]}'
         execute(exec_cmd)
-        result = SslyzeJSONParser("/tmp/sslyze.json", "SSlyze").items
+        result = spec.get_parser()(report_path, "SSlyze").items
         return tool_name, result
 
     @staticmethod
     def masscan(config):
         tool_name = "masscan"
-        host = config["host"]
-        result = list()
-        if not (find_ip(host)):
-            host = find_ip(str(execute(f'getent hosts {host}')[0]))
-            if len(host) > 0:
-                host = host[0].strip()
-        if host:
-            if config.get("exclusions", None):
-                excluded_addon = f'--exclude-ports {config.get("exclusions", None)}'
-            else:
-                excluded_addon = ''
-            ports = config.get("inclusions", "0-65535")
-            exec_cmd = f'masscan {host} -p {ports} -pU:{ports} --rate 1000 -oJ /tmp/masscan.json {excluded_addon}'
-            execute(exec_cmd.strip())
-            result = MasscanJSONParser("/tmp/masscan.json", "masscan").items
-        return tool_name, result
+        targets = masscan_targets(config["host"])
+        if not targets:
+            return tool_name, list()
+        if config.get("exclusions", None):
+            excluded_addon = f'--exclude-ports {config.get("exclusions", None)}'
+        else:
+            excluded_addon = ''
+        ports = config.get("inclusions", "0-65535")
+        parallel = shards_count(config.get("shards", c.MASSCAN_DEFAULT_SHARDS))
+        rate = MasscanRate(config.get("rate", c.MASSCAN_DEFAULT_RATE), config.get("adaptive_rate", False),
+                           config.get("min_rate", c.MASSCAN_MIN_RATE), config.get("max_rate", c.MASSCAN_MAX_RATE),
+                           config.get("rate_step", c.MASSCAN_RATE_STEP))
+        shards = parallel * c.MASSCAN_ADAPTIVE_ROUNDS if rate.adaptive else parallel
+        work_dir = get_work_dir(config, "masscan")
+        targets_path = os.path.join(work_dir, "targets.txt")
+        with open(targets_path, "w") as f:
+            f.write("\n".join(targets))
+        # Shards split the same randomized scan, so all of them must use the same seed
+        seed = randrange(1, 2 ** 31)
+        parser = get_tool("masscan").get_parser()(None, "masscan")
+
+        def _scan_shard(shard):
+            shard_addon = f'--shard {shard}/{shards} --seed {seed}' if shards > 1 else ''
+            exec_cmd = f'masscan -iL {targets_path} -p {ports} -pU:{ports} --rate {rate.per_process(parallel)} ' \
+                       f'{shard_addon} -oJ - {excluded_addon}'
+            _, stderr = execute_streaming(exec_cmd.strip(), parser.stream())
+            rate.update(len(re.findall(c.MASSCAN_TRANSMIT_ERRORS, stderr.decode("utf-8", errors="ignore"))))
+
+        with ThreadPoolExecutor(max_workers=parallel) as executor:
+            list(executor.map(_scan_shard, range(1, shards + 1)))
+        return tool_name, parser.items
 
     @staticmethod
     def nikto(config):
         tool_name = "nikto"
-        if os.path.exists("/tmp/nikto.xml"):
-            os.remove("/tmp/nikto.xml")
+        spec = get_tool("nikto")
+        work_dir = get_work_dir(config, spec.name)
+        report_path = spec.report_path(work_dir)
         exec_cmd = f'perl nikto.pl {config.get("param", "")} -h {config["host"]} -p {config["port"]} ' \
-                   f'-Format xml -output /tmp/nikto.xml -Save /tmp/extended_nikto'
+                   f'-Format xml -output {report_path} -Save {os.path.join(work_dir, "extended_nikto")}'
         cwd = '/opt/nikto/program'
         execute(exec_cmd, cwd)
-        result = NiktoXMLParser("/tmp/nikto.xml", "Nikto").items
+        result = spec.get_parser()(report_path, "Nikto").items
         return tool_name, result
 
     @staticmethod
@@ -84,13 +250,14 @@ class DustyWrapper(object):
         tool_name = "NMAP"
         excluded_addon = f'--exclude-ports {config.get("exclusions", None)}' if config.get("exclusions", None) else ""
         ports = config.get("inclusions", "0-65535")
-        nse_scripts = config.get("nse_scripts", "ssl-date,http-mobileversion-checker,http-robots.txt,http-title,"
-                                                "http-waf-detect,http-chrono,http-headers,http-comments-displayer,"
-                                                "http-date")
+        nse_scripts = config.get("nse_scripts", c.NMAP_DEFAULT_NSE_SCRIPTS)
         exec_cmd = f'nmap -PN -p{ports} {excluded_addon} ' \
                    f'--min-rate 1000 --max-retries 0 --max-rtt-timeout 200ms ' \
                    f'{config["host"]}'
         res = execute(exec_cmd)
+        shards = shards_count(config.get("shards", c.NMAP_DEFAULT_SHARDS))
+        if shards > 1:
+            return tool_name, nmap_sharded_scan(config, res[0], nse_scripts, shards)
         tcp_ports = ''
         udp_ports = ''
         for each in re.findall(r'([0-9]*/[tcp|udp])', str(res[0])):
@@ -103,28 +270,40 @@ class DustyWrapper(object):
         if not ports:
             return (tool_name, [])
         params = config.get("params", "-v -sVA")
+        spec = get_tool("nmap")
+        report_path = spec.report_path(get_work_dir(config, spec.name))
         exec_cmd = f'nmap {params} {ports} ' \
                    f'--min-rate 1000 --max-retries 0 ' \
-                   f'--script={nse_scripts} {config["host"]} -oX /tmp/nmap.xml'
+                   f'--script={nse_scripts} {config["host"]} -oX {report_path}'
         execute(exec_cmd)
-        result = NmapXMLParser('/tmp/nmap.xml', "NMAP").items
+        result = spec.get_parser()(report_path, "NMAP").items
         return tool_name, result
 
     @staticmethod
     def w3af(config):
         tool_name = "w3af"
+        spec = get_tool("w3af")
+        work_dir = get_work_dir(config, spec.name)
+        report_path = spec.report_path(work_dir)
         config_file = config.get("config_file", "/tmp/w3af_full_audit.w3af")
-        w3af_execution_command = f'w3af_console -y -n -s {config_file}'
         with open(config_file, 'r') as f:
             config_content = f.read()
         if '{target}' in config_content:
             config_content = config_content.format(
                 target=f'{config.get("protocol")}://{config.get("host")}:{config.get("port")}',
-                output_section=c.W3AF_OUTPUT_SECTION)
+                output_section=c.W3AF_OUTPUT_SECTION.format(output_file=report_path))
+        else:  # Pre-rendered config, redirect its xml output into work dir
+            config_content, replaced = W3AF_OUTPUT_FILE.subn(lambda match: match.group(1) + report_path,
+                                                            config_content)
+            if not replaced:
+                logging.warning("w3af config %s does not set output_file, report is not expected in %s",
+                                config_file, report_path)
+        config_file = os.path.join(work_dir, os.path.basename(config_file))
         with open(config_file, 'w') as f:
             f.write(config_content)
+        w3af_execution_command = f'w3af_console -y -n -s {config_file}'
         execute(w3af_execution_command)
-        result = W3AFXMLParser("/tmp/w3af.xml", "w3af").items
+        result = spec.get_parser()(report_path, "w3af").items
         return tool_name, result
 
     @staticmethod
@@ -145,12 +324,14 @@ class DustyWrapper(object):
         else:
             project_name = config.get('project_name')
         target = f'{config.get("protocol")}://{config.get("host")}:{config.get("port")}'
+        spec = get_tool("qualys")
+        report_path = spec.report_path(get_work_dir(config, spec.name))
         project_id = None
         auth_id = None
         scan_id = None
         report_id = None
         try:
-            qualys = WAS()
+            qualys = get_driver("qualys")()
             ts = datetime.utcfromtimestamp(int(time())).strftime('%Y-%m-%d %H:%M:%S')
             logging.info("Qualys: searching for existing project")
             project_id = qualys.search_for_project(project_name)
@@ -194,7 +375,7 @@ class DustyWrapper(object):
             while not qualys.get_report_status(report_id):
                 sleep(c.QUALYS_STATUS_CHECK_INTERVAL)
             logging.info("Qualys: downloading report")
-            qualys.download_report(report_id)
+            qualys.download_report(report_id, report_path)
         finally:
             if report_id:
                 logging.info("Qualys: deleting report")
@@ -212,7 +393,7 @@ class DustyWrapper(object):
                     logging.info("Qualys: deleting webapp")
                     qualys.delete_asset("webapp", project_id)
         logging.info("Qualys: processing results")
-        result = QualysWebAppParser("/tmp/qualys.xml", "qualys_was").items
+        result = spec.get_parser()(report_path, "qualys_was").items
         return tool_name, result
 
     @staticmethod
@@ -224,8 +405,15 @@ class DustyWrapper(object):
     @staticmethod
     def aemhacker(config):
         tool_name = "AEM_Hacker"
-        aem_hacker_output = execute(f'aem-wrapper.sh -u {config.get("protocol")}://{config.get("host")}:{config.get("port")} --host {config.get("scanner_host", "127.0.0.1")} --port {config.get("scanner_port", "4444")}')[0].decode('utf-8')
-        result = AemOutputParser(aem_hacker_output).items
+        spec = get_tool("aemhacker")
+        output_path = spec.report_path(get_work_dir(config, spec.name))
+        execute_streaming(f'aem-wrapper.sh -u {config.get("protocol")}://{config.get("host")}:{config.get("port")} '
+                          f'--host {config.get("scanner_host", "127.0.0.1")} '
+                          f'--port {config.get("scanner_port", "4444")}',
+                          output_path, timeout=config.get("timeout", None))
+        with open(output_path, encoding="utf-8") as f:
+            aem_hacker_output = f.read()
+        result = spec.get_parser()(aem_hacker_output).items
         return tool_name, result
 
     @staticmethod
@@ -241,6 +429,9 @@ class DustyWrapper(object):
                 if next_status != current_status:
                     logging.info(message, next_status)
                 current_status = next_status
+        # ZAP client and resources are only needed here
+        import pkg_resources
+        from zapv2 import ZAPv2
         # ZAP wrapper
         tool_name = "ZAP"
         results = list()
@@ -255,13 +446,11 @@ class DustyWrapper(object):
             "-config", "api.addrs.addr.name=.*",
             "-config", "ajaxSpider.browserId=htmlunit"
         ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        zap_api = ZAPv2(
-            apikey="dusty",
-            proxies={
-                "http": "http://127.0.0.1:8091",
-                "https": "http://127.0.0.1:8091"
-            }
-        )
+        zap_proxies = {
+            "http": "http://127.0.0.1:8091",
+            "https": "http://127.0.0.1:8091"
+        }
+        zap_api = ZAPv2(apikey="dusty", proxies=zap_proxies)
         # Wait for zap to start
         zap_started = False
         for _ in range(600):
@@ -435,14 +624,18 @@ class DustyWrapper(object):
         )
         # Get report
         logging.info("Scan finished. Processing results")
-        zap_report = zap_api.core.jsonreport()
         if os.environ.get("debug", False):
-            with open("/tmp/zap.json", "wb") as report_file:
-                report_file.write(zap_report.encode("utf-8"))
-        # Stop zap
-        zap_daemon.kill()
-        zap_daemon.wait()
-        # Parse JSON
-        results.extend(ZapJsonParser(zap_report, tool_name).items)
-        pkg_resources.cleanup_resources()
-        return tool_name, results
+            with open(get_tool("zap").report_path(get_work_dir(config, "zap")), "wb") as report_file:
+                report_file.write(zap_api.core.jsonreport().encode("utf-8"))
+        # Page alerts through API while post-processing consumes findings, ZAP is stopped after the last page
+        page_size = config.get("alerts_page_size", c.ZAP_ALERTS_PAGE_SIZE)
+
+        def _findings():
+            try:
+                yield from get_tool("zap").get_parser()(zap_api, tool_name, page_size).items
+            finally:
+                zap_daemon.kill()
+                zap_daemon.wait()
+                pkg_resources.cleanup_resources()
+
+        return tool_name, _findings()
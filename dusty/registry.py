@@ -0,0 +1,225 @@
+#   Copyright 2019 getcarrier.io
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+    Registry of scanners, parsers and reporters, imported on first use
+
+    Scanners and integrations pull heavy dependencies (ZAP, Jira, ReportPortal, lxml, ...),
+    so modules are referenced by "module:attribute" paths and imported only when needed.
+    Third-party scanners are registered with ToolSpec objects in "dusty.scanners" entry points
+"""
+
+import os
+import logging
+import importlib
+import threading
+
+from dusty import constants as c
+
+
+class ToolSpec(object):
+    """ Scanner declaration: how to run it, what it produces and which resources it needs """
+
+    def __init__(self, name, kind, execute, parser=None, artifact=None,
+                 concurrency=c.CONCURRENCY_CPU, memory=c.DEFAULT_TOOL_MEMORY, streaming=False):
+        """
+        :param name: scanner name (config key or language)
+        :param kind: 'sast' (execute returns processed results) or 'dast' (execute returns tool name and results)
+        :param execute: "module:attribute" path of callable taking scanner config
+        :param parser: parser name from PARSERS or "module:attribute" path, None if tool has no report of its own
+        :param artifact: file name of report produced by tool, None if output is not saved to file
+        :param concurrency: concurrency class - 'network', 'cpu' or 'remote', used as scheduler group
+        :param memory: expected peak memory in MB
+        :param streaming: True if output is streamed into file or parser instead of being buffered in memory
+        """
+        self.name = name
+        self.kind = kind
+        self.execute = execute
+        self.parser = parser
+        self.artifact = artifact
+        self.concurrency = concurrency
+        self.memory = memory
+        self.streaming = streaming
+
+    def run(self, config):
+        return resolve(self.execute)(config)
+
+    def get_parser(self):
+        """ Returns parser class declared by scanner """
+        if self.parser is None:
+            raise KeyError(f"Scanner {self.name} declares no parser")
+        return get_parser(self.parser)
+
+    def report_path(self, work_dir, shard=None):
+        """ Returns path of scanner report in work_dir, every shard of sharded scan gets numbered report """
+        if self.artifact is None:
+            raise KeyError(f"Scanner {self.name} declares no report file")
+        if shard is None:
+            return os.path.join(work_dir, self.artifact)
+        base, extension = os.path.splitext(self.artifact)
+        return os.path.join(work_dir, f"{base}_{shard}{extension}")
+
+
+SAST_WRAPPER = "dusty.sastyWrapper:SastyWrapper."
+DAST_WRAPPER = "dusty.dustyWrapper:DustyWrapper."
+
+TOOLS = {spec.name: spec for spec in [
+    # DAST
+    ToolSpec("aemhacker", "dast", DAST_WRAPPER + "aemhacker", "aemhacker", "aem_hacker.txt",
+             c.CONCURRENCY_NETWORK, 256, streaming=True),
+    ToolSpec("burp", "dast", DAST_WRAPPER + "burp", None, None, c.CONCURRENCY_NETWORK, 64),
+    ToolSpec("masscan", "dast", DAST_WRAPPER + "masscan", "masscan", None, c.CONCURRENCY_NETWORK, 128,
+             streaming=True),
+    ToolSpec("nikto", "dast", DAST_WRAPPER + "nikto", "nikto", "nikto.xml", c.CONCURRENCY_NETWORK, 256),
+    ToolSpec("nmap", "dast", DAST_WRAPPER + "nmap", "nmap", "nmap.xml", c.CONCURRENCY_NETWORK, 256),
+    ToolSpec("qualys", "dast", DAST_WRAPPER + "qualys", "qualys", "qualys.xml", c.CONCURRENCY_REMOTE, 512),
+    ToolSpec("sslyze", "dast", DAST_WRAPPER + "sslyze", "sslyze", "sslyze.json", c.CONCURRENCY_NETWORK, 128),
+    ToolSpec("w3af", "dast", DAST_WRAPPER + "w3af", "w3af", "w3af.xml", c.CONCURRENCY_NETWORK, 1024),
+    ToolSpec("zap", "dast", DAST_WRAPPER + "zap", "zap", "zap.json", c.CONCURRENCY_NETWORK, 1024, streaming=True),
+    # SAST languages, results of their tools are merged
+    ToolSpec("golang", "sast", SAST_WRAPPER + "golang", None, None, c.CONCURRENCY_CPU, 512),
+    ToolSpec("java", "sast", SAST_WRAPPER + "java", None, None, c.CONCURRENCY_CPU, 2048),
+    ToolSpec("nodejs", "sast", SAST_WRAPPER + "nodejs", None, None, c.CONCURRENCY_CPU, 512),
+    ToolSpec("python", "sast", SAST_WRAPPER + "python", None, None, c.CONCURRENCY_CPU, 512),
+    ToolSpec("ruby", "sast", SAST_WRAPPER + "ruby", "brakeman", "brakeman.json", c.CONCURRENCY_CPU, 512),
+    # SAST tools
+    ToolSpec("bandit", "sast", SAST_WRAPPER + "bandit", "bandit", "bandit.json", c.CONCURRENCY_CPU, 512,
+             streaming=True),
+    ToolSpec("dependency_check", "sast", SAST_WRAPPER + "dependency_check", "dependency_check",
+             "dependency-check-report.json", c.CONCURRENCY_NETWORK, 2048),
+    ToolSpec("gosec", "sast", SAST_WRAPPER + "gosec", "gosec", "gosec.json", c.CONCURRENCY_CPU, 512, streaming=True),
+    ToolSpec("nodejsscan", "sast", SAST_WRAPPER + "nodejsscan", "nodejsscan", "nodejsscan.json",
+             c.CONCURRENCY_CPU, 512),
+    ToolSpec("npm", "sast", SAST_WRAPPER + "npm", "npm", "npm_audit.json", c.CONCURRENCY_NETWORK, 256, streaming=True),
+    ToolSpec("ptai", "sast", SAST_WRAPPER + "ptai", "ptai", None, c.CONCURRENCY_CPU, 2048),
+    ToolSpec("retirejs", "sast", SAST_WRAPPER + "retirejs", "retirejs", "retirejs.json", c.CONCURRENCY_NETWORK, 256),
+    ToolSpec("safety", "sast", SAST_WRAPPER + "safety", "safety", "safety_report.json", c.CONCURRENCY_NETWORK, 256,
+             streaming=True),
+    ToolSpec("spotbugs", "sast", SAST_WRAPPER + "spotbugs", "spotbugs", "spotbugs.xml", c.CONCURRENCY_CPU, 2048)
+]}
+
+PARSERS = {
+    "aemhacker": "dusty.data_model.aemhacker.parser:AemOutputParser",
+    "bandit": "dusty.data_model.bandit.parser:BanditParser",
+    "brakeman": "dusty.data_model.brakeman.parser:BrakemanParser",
+    "dependency_check": "dusty.data_model.dependency_check.parser:DependencyCheckParser",
+    "gosec": "dusty.data_model.gosec.parser:GosecOutputParser",
+    "masscan": "dusty.data_model.masscan.parser:MasscanJSONParser",
+    "nikto": "dusty.data_model.nikto.parser:NiktoXMLParser",
+    "nmap": "dusty.data_model.nmap.parser:NmapXMLParser",
+    "nodejsscan": "dusty.data_model.nodejsscan.parser:NodeJsScanParser",
+    "npm": "dusty.data_model.npm.parser:NpmScanParser",
+    "ptai": "dusty.data_model.ptai.parser:PTAIScanParser",
+    "qualys": "dusty.data_model.qualys.parser:QualysWebAppParser",
+    "retirejs": "dusty.data_model.retire.parser:RetireScanParser",
+    "safety": "dusty.data_model.safety.parser:SafetyScanParser",
+    "spotbugs": "dusty.data_model.spotbugs.parser:SpotbugsParser",
+    "sslyze": "dusty.data_model.sslyze.parser:SslyzeJSONParser",
+    "w3af": "dusty.data_model.w3af.parser:W3AFXMLParser",
+    "zap": "dusty.data_model.zap.parser:ZapApiParser"
+}
+
+REPORTERS = {
+    "emails": "dusty.drivers.emails:EmailWrapper",
+    "html": "dusty.drivers.html:HTMLReport",
+    "influx": "dusty.drivers.influx:InfluxReport",
+    "jira": "dusty.drivers.jira:JiraWrapper",
+    "loki": "dusty.drivers.loki:enable_loki_logging",
+    "redis": "dusty.drivers.redis_file:RedisFile",
+    "reportportal": "dusty.drivers.rp.report_portal_writer:launch_reportportal_service",
+    "reportportal_finish": "dusty.drivers.rp.report_portal_writer:finish_reportportal_service",
+    "xunit": "dusty.drivers.xunit:XUnitReport"
+}
+
+# Clients used by scanners themselves (scan APIs, enrichment), not for reporting results
+DRIVERS = {
+    "nvd": "dusty.drivers.nvd:make_nvd_enricher",
+    "qualys": "dusty.drivers.qualys:WAS"
+}
+
+resolved = dict()
+resolve_lock = threading.Lock()
+
+
+def resolve(path):
+    """ Imports "module:attribute[.attribute]" path once and returns attribute """
+    if path not in resolved:
+        with resolve_lock:
+            if path not in resolved:
+                module_name, attribute = path.split(":", 1)
+                target = importlib.import_module(module_name)
+                for name in attribute.split("."):
+                    target = getattr(target, name)
+                resolved[path] = target
+    return resolved[path]
+
+
+def iter_entry_points(group):
+    """ Returns installed entry points of group without loading them """
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # Python < 3.8
+        import pkg_resources
+        return list(pkg_resources.iter_entry_points(group))
+    points = entry_points()
+    if hasattr(points, "select"):
+        return list(points.select(group=group))
+    return list(points.get(group, []))
+
+
+def load_tool(name):
+    """ Loads ToolSpec of third-party scanner, only plugin providing requested scanner is imported """
+    for entry_point in iter_entry_points(c.SCANNERS_ENTRY_POINT_GROUP):
+        if entry_point.name != name:
+            continue
+        spec = entry_point.load()
+        if not isinstance(spec, ToolSpec):
+            raise TypeError(f"Entry point {name} in {c.SCANNERS_ENTRY_POINT_GROUP} must be a ToolSpec")
+        logging.debug("Loaded scanner %s from entry point %s", name, entry_point)
+        return spec
+    return None
+
+
+def get_tool(name):
+    """ Returns ToolSpec of built-in or third-party scanner """
+    if name not in TOOLS:
+        with resolve_lock:
+            spec = TOOLS.get(name, None) or load_tool(name)
+            if spec is None:
+                raise KeyError(f"Unknown scanner: {name}")
+            TOOLS[name] = spec
+    return TOOLS[name]
+
+
+def _lookup(registry, kind, name):
+    if name not in registry:
+        raise KeyError(f"Unknown {kind}: {name}")
+    return resolve(registry[name])
+
+
+def get_parser(name):
+    """ Returns parser class for tool, plugins may pass "module:attribute" path """
+    if ":" in name:
+        return resolve(name)
+    return _lookup(PARSERS, "parser", name)
+
+
+def get_reporter(name):
+    """ Returns reporter/integration class or function """
+    return _lookup(REPORTERS, "reporter", name)
+
+
+def get_driver(name):
+    """ Returns scanner driver class or factory """
+    return _lookup(DRIVERS, "driver", name)
@@ -13,29 +13,22 @@
 #   limitations under the License.
 
 import argparse
+import hashlib
 import os
 import re
 import yaml
-import requests
 import logging
 from copy import deepcopy
+from contextlib import nullcontext
 from traceback import format_exc
 from time import time
 
 from dusty import constants
-from dusty.drivers.rp.report_portal_writer import launch_reportportal_service
-from dusty.drivers.jira import JiraWrapper
-from dusty.drivers.emails import EmailWrapper
-from dusty.dustyWrapper import DustyWrapper
-from dusty.sastyWrapper import SastyWrapper
-from dusty.drivers.html import HTMLReport
-from dusty.drivers.xunit import XUnitReport
-from dusty.drivers.redis_file import RedisFile
-from dusty.drivers.influx import InfluxReport
-from dusty.drivers.loki import enable_loki_logging
-from dusty.utils import send_emails, common_post_processing, prepare_jira_mapping, flush_logs
-
-requests.packages.urllib3.disable_warnings()
+from dusty.cache import DiskCache
+from dusty.registry import get_tool, get_reporter
+from dusty.scheduler import ScanScheduler
+from dusty.utils import send_emails, common_post_processing, prepare_jira_mapping, flush_logs, \
+    prepare_work_dir, cleanup_work_dir
 
 
 def proxy_through_env(value):
@@ -124,7 +117,12 @@ def parse_jira_config(config):
         logging.warning("Jira integration configuration is messed up , proceeding without Jira")
         return None
 
-    return JiraWrapper(jira_url, jira_user, jira_pwd, jira_project, jira_fields)
+    jira_wrapper = get_reporter("jira")
+    return jira_wrapper(jira_url, jira_user, jira_pwd, jira_project, jira_fields,
+                        max_workers=proxy_through_env(jira_config.get("max_workers", 1)),
+                        rate_limit=proxy_through_env(jira_config.get("rate_limit", None)),
+                        metadata_cache_ttl=proxy_through_env(jira_config.get("metadata_cache_ttl", None)),
+                        invalidate_metadata_cache=jira_config.get("invalidate_metadata_cache", False))
 
 
 def parse_email_config(config):
@@ -150,8 +148,9 @@ def parse_email_config(config):
         if not (emails_smtp_server and emails_login and emails_password and emails_receivers_email_list):
             logging.warning("Emails integration configuration is messed up , proceeding without Emails")
         else:
-            emails_service = EmailWrapper(emails_smtp_server, emails_login, emails_password, emails_port,
-                                          emails_receivers_email_list, emails_subject, emails_body)
+            email_wrapper = get_reporter("emails")
+            emails_service = email_wrapper(emails_smtp_server, emails_login, emails_password, emails_port,
+                                           emails_receivers_email_list, emails_subject, emails_body)
 
     return emails_service, email_attachments
 
@@ -178,19 +177,56 @@ def parse_rp_config(config, test_name):
     return rp_config
 
 
-def read_config(args):
-    def default_ctor(loader, tag_suffix, node):
-        return tag_suffix + node.value
+class ConfigLoader(getattr(yaml, "CSafeLoader", yaml.SafeLoader)):
+    """ YAML loader for configs: C-accelerated when libyaml is available, unknown tags are kept as strings """
+
+
+def default_ctor(loader, tag_suffix, node):
+    return tag_suffix + node.value
+
+
+ConfigLoader.add_multi_constructor('', default_ctor)
+
+config_cache = dict()
+
 
+def is_json_compatible(obj):
+    """ Checks that obj survives JSON round trip unchanged """
+    if isinstance(obj, dict):
+        return all(isinstance(key, str) and is_json_compatible(value) for key, value in obj.items())
+    if isinstance(obj, list):
+        return all(is_json_compatible(item) for item in obj)
+    return obj is None or isinstance(obj, (str, int, float, bool))
+
+
+def load_config_data(config_data):
+    """ Parses YAML config, parsed structure is cached on disk by content hash if config_cache env is set """
+    cache_path = os.environ.get("config_cache", None)
+    if not cache_path:
+        return yaml.load(config_data, Loader=ConfigLoader)
+    cache = DiskCache("config", path=cache_path)
+    content_hash = hashlib.sha256(config_data).hexdigest()
+    config = cache.get(content_hash)
+    if config is None:
+        config = yaml.load(config_data, Loader=ConfigLoader)
+        if is_json_compatible(config):
+            cache.set(content_hash, config)
+    return config
+
+
+def read_config(args):
     config_data = args.config_data
     if not config_data:
         with open(args.config, "rb") as f:
             config_data = f.read()
+    if isinstance(config_data, str):
+        config_data = config_data.encode("utf-8")
 
-    yaml.add_multi_constructor('', default_ctor)
-    config = variable_substitution(yaml.load(config_data))
+    content_hash = hashlib.sha256(config_data).hexdigest()
+    if content_hash not in config_cache:
+        config_cache[content_hash] = variable_substitution(load_config_data(config_data))
 
-    return config
+    return deepcopy(config_cache[content_hash])
 
 
 def config_from_yaml(args):
@@ -244,7 +280,12 @@ def config_from_yaml(args):
                           path_to_false_positive=args.fp_config,
                           email_service=email_service,
                           email_attachments=email_attachments,
-                          composition_analysis=execution_config.get('composition_analysis', None))
+                          composition_analysis=execution_config.get('composition_analysis', None),
+                          work_dir=prepare_work_dir(proxy_through_env(
+                              execution_config.get('work_dir', os.environ.get("work_dir", constants.PATH_TO_WORK_DIR)))),
+                          max_concurrency=execution_config.get('max_concurrency', 1),
+                          concurrency_limits=execution_config.get('concurrency_limits', dict()),
+                          memory_limit=execution_config.get('memory_limit', None))
 
     tests_config = {}
 
@@ -272,25 +313,25 @@ def process_results(default_config, start_time, global_results=None,
                     other_results=None, global_errors=None):
     created_jira_tickets = []
     attachments = []
-    rp_client = launch_reportportal_service(default_config['rp_config'])
-    if rp_client:
-        rp_client.finish_test()
+    if default_config['rp_config']:
+        get_reporter("reportportal")(default_config['rp_config']).finish_test()
     default_config['execution_time'] = int(time() - start_time)
     if other_results is None:
         other_results = []
     if default_config.get('generate_html', None):
-        html_report_file = HTMLReport(sorted(global_results, key=lambda item: item.severity),
-                                      default_config,
-                                      other_findings=sorted(other_results, key=lambda item: item.severity)).report_name
+        html_report = get_reporter("html")
+        html_report_file = html_report(sorted(global_results, key=lambda item: item.severity),
+                                       default_config,
+                                       other_findings=sorted(other_results, key=lambda item: item.severity)).report_name
     if default_config.get('generate_junit', None):
-        xml_report_file = XUnitReport(global_results, default_config).report_name
+        xml_report_file = get_reporter("xunit")(global_results, default_config).report_name
     if os.environ.get("redis_connection"):
-        RedisFile(os.environ.get("redis_connection"), html_report_file, xml_report_file)
+        get_reporter("redis")(os.environ.get("redis_connection"), html_report_file, xml_report_file)
     if default_config.get('jira_service', None):
         created_jira_tickets = default_config['jira_service'].get_created_tickets()
     if default_config.get('influx', None):
         try:
-            InfluxReport(global_results, other_results, created_jira_tickets, default_config)
+            get_reporter("influx")(global_results, other_results, created_jira_tickets, default_config)
         except BaseException as e:
             logging.error("Exception during influx reporting")
             global_errors["Influx"] = str(e)
@@ -305,13 +346,66 @@ def process_results(default_config, start_time, global_results=None,
                     attachments=attachments, errors=global_errors)
 
 
+def close_integrations(default_config):
+    """ Closes shared Jira session and ReportPortal publisher, also when scanning failed """
+    try:
+        if default_config.get('jira_service', None):
+            default_config['jira_service'].close()
+        if default_config.get('rp_config', None):
+            get_reporter("reportportal_finish")()
+    except BaseException:
+        logging.error("Exception during closing integrations")
+        logging.debug(format_exc())
+
+
 def list_of_available_suites(args):
     config = read_config(args)
     suites = list(config.keys())
     return suites
 
 
+def scanner_name(key, config):
+    """ Returns tool name for suite key (language key selects language scanner) """
+    return config[key] if 'language' in key else key
+
+
+def run_scanner(key, config):
+    """ Runs single scanner from suite, returns results, other results, errors and created Jira tickets """
+    results = []
+    other_results = []
+    errors = dict()
+    jira_tickets = []
+    name = scanner_name(key, config)
+    jira_service = config.get("jira_service", None)
+    with jira_service.collect_created_tickets(jira_tickets) if jira_service else nullcontext():
+        try:
+            tool = get_tool(name)
+            if tool.kind == "sast":
+                results = tool.run(config)
+            else:
+                tool_name, result = tool.run(config)
+                results, other_results = common_post_processing(config, result, tool_name,
+                                                                need_other_results=True, global_errors=errors)
+        except BaseException as e:
+            logging.error("Exception during %s Scanning" % name)
+            errors[name] = str(e)
+            logging.debug(format_exc())
+    return results, other_results, errors, jira_tickets
+
+
+def scanner_task(key, config):
+    """ Returns scheduler task for suite key, tool resource profile defines scheduler groups and memory """
+    try:
+        tool = get_tool(scanner_name(key, config))
+        groups, memory = [key, tool.kind, tool.concurrency], tool.memory
+    except (KeyError, TypeError, ImportError):
+        groups, memory = [key], 0  # Error is reported when task runs
+    return key, groups, lambda: run_scanner(key, config), memory
+
+
 def main():
+    import requests  # Drivers use requests, keep it out of module import for fast CLI startup
+    requests.packages.urllib3.disable_warnings()
     args = parse_args()
     logging_level = logging.DEBUG if args.debug or os.environ.get("debug", False) else logging.INFO
 
@@ -339,43 +433,32 @@ def main():
 
     default_config, test_configs = config_from_yaml(args)
 
-    # Enable Loki logging
-    enable_loki_logging(default_config)
-
-    for key in test_configs:
-        results = []
-        other_results = []
-        config = test_configs[key]
-        if key in constants.SASTY_SCANNERS_CONFIG_KEYS:
-            if key == "scan_opts":
-                continue
-            attr_name = config[key] if 'language' in key else key
-            try:
-                results = getattr(SastyWrapper, attr_name)(config)
-            except BaseException as e:
-                logging.error("Exception during %s Scanning" % attr_name)
-                global_errors[attr_name] = str(e)
-                logging.debug(format_exc())
-        else:
-            try:
-                tool_name, result = getattr(DustyWrapper, key)(config)
-                results, other_results = common_post_processing(config, result, tool_name, need_other_results=True,
-                                                                global_errors=global_errors)
-            except BaseException as e:
-                logging.error("Exception during %s Scanning" % key)
-                global_errors[key] = str(e)
-                logging.debug(format_exc())
-
-        if default_config.get('jira_service', None) and config.get('jira_service', None) \
-                and config.get('jira_service').valid:
-            default_config['jira_service'].created_jira_tickets.extend(config.get('jira_service').get_created_tickets())
-
-        if default_config.get('generate_html', None) or default_config.get('generate_junit', None):
-            global_results.extend(results)
-            global_other_results.extend(other_results)
-
-    process_results(default_config, start_time, global_results, other_results=global_other_results,
-                    global_errors=global_errors)
+    try:
+        # Enable Loki logging
+        if default_config.get("loki", None):
+            get_reporter("loki")(default_config)
+
+        tasks = [scanner_task(key, test_configs[key]) for key in test_configs if key != "scan_opts"]
+
+        limits = {constants.CONCURRENCY_CPU: os.cpu_count() or 1}
+        limits.update(default_config.get('concurrency_limits', None) or dict())
+        scheduler = ScanScheduler(default_config.get('max_concurrency', 1), limits,
+                                  default_config.get('memory_limit', None))
+        for results, other_results, errors, jira_tickets in scheduler.run(tasks):
+            global_errors.update(errors)
+            if default_config.get('jira_service', None):
+                # Scanners report concurrently, their tickets are merged in suite order
+                default_config['jira_service'].add_created_tickets(jira_tickets)
+
+            if default_config.get('generate_html', None) or default_config.get('generate_junit', None):
+                global_results.extend(results)
+                global_other_results.extend(other_results)
+
+        process_results(default_config, start_time, global_results, other_results=global_other_results,
+                        global_errors=global_errors)
+    finally:
+        close_integrations(default_config)
+        cleanup_work_dir(default_config, args.debug)
     flush_logs()
 
 
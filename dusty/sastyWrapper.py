@@ -12,19 +12,12 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
+import os
+
 from dusty import constants
 from dusty.utils import execute, common_post_processing, ptai_post_processing, \
-    run_in_parallel, get_dependencies
-from dusty.data_model.bandit.parser import BanditParser
-from dusty.data_model.brakeman.parser import BrakemanParser
-from dusty.data_model.spotbugs.parser import SpotbugsParser
-from dusty.data_model.nodejsscan.parser import NodeJsScanParser
-from dusty.data_model.npm.parser import NpmScanParser
-from dusty.data_model.retire.parser import RetireScanParser
-from dusty.data_model.ptai.parser import PTAIScanParser
-from dusty.data_model.safety.parser import SafetyScanParser
-from dusty.data_model.dependency_check.parser import DependencyCheckParser
-from dusty.data_model.gosec.parser import GosecOutputParser
+    run_in_parallel, get_dependencies, get_work_dir, execute_streaming
+from dusty.registry import get_tool, get_driver
 
 
 class SastyWrapper(object):
@@ -68,10 +61,11 @@ class SastyWrapper(object):
     @staticmethod
     def bandit(config, results=None):
         exec_cmd = "bandit -r {} --format json".format(SastyWrapper.get_code_path(config))
-        res = execute(exec_cmd, cwd=SastyWrapper.get_code_path(config))
-        with open("/tmp/bandit.json", "w") as f:
-            f.write(res[0].decode('utf-8', errors='ignore'))
-        result = BanditParser("/tmp/bandit.json", "pybandit").items
+        spec = get_tool("bandit")
+        report_path = spec.report_path(get_work_dir(config, spec.name))
+        execute_streaming(exec_cmd, report_path, cwd=SastyWrapper.get_code_path(config),
+                          timeout=config.get("timeout", None))
+        result = spec.get_parser()(report_path, "pybandit").items
         return SastyWrapper.extend_result(results, result)
 
     @staticmethod
@@ -85,10 +79,12 @@ class SastyWrapper(object):
         if config.get('excluded_files', None):
             exclude_checks = f'--skip-files {config.get("excluded_files")} '
         excluded_files = ''
+        spec = get_tool("ruby")
+        report_path = spec.report_path(get_work_dir(config, "brakeman"))
         exec_cmd = f"brakeman {included_checks}{exclude_checks}--no-exit-on-warn --no-exit-on-error {excluded_files}" \
-                   f"-o /tmp/brakeman.json " + SastyWrapper.get_code_path(config)
+                   f"-o {report_path} " + SastyWrapper.get_code_path(config)
         execute(exec_cmd, cwd=SastyWrapper.get_code_path(config))
-        result = BrakemanParser("/tmp/brakeman.json", "brakeman").items
+        result = spec.get_parser()(report_path, "brakeman").items
         filtered_result = common_post_processing(config, result, "brakeman")
         return filtered_result
 
@@ -107,10 +103,12 @@ class SastyWrapper(object):
 
     @staticmethod
     def spotbugs(config, results=None):
-        exec_cmd = "spotbugs -xml:withMessages {} -output /tmp/spotbugs.xml {}" \
-                   "".format(config.get("scan_opts", ""), SastyWrapper.get_code_path(config))
+        spec = get_tool("spotbugs")
+        report_path = spec.report_path(get_work_dir(config, spec.name))
+        exec_cmd = "spotbugs -xml:withMessages {} -output {} {}" \
+                   "".format(config.get("scan_opts", ""), report_path, SastyWrapper.get_code_path(config))
         execute(exec_cmd, cwd=SastyWrapper.get_code_path(config))
-        result = SpotbugsParser("/tmp/spotbugs.xml", "spotbugs").items
+        result = spec.get_parser()(report_path, "spotbugs").items
         return SastyWrapper.extend_result(results, result)
 
     @staticmethod
@@ -121,33 +119,42 @@ class SastyWrapper(object):
             scan_fns.extend([SastyWrapper.npm, SastyWrapper.retirejs])
             config['add_devdep'] = composition_analysis.get('devdep', False) \
                 if isinstance(composition_analysis, dict) else False
+            config['nvd'] = composition_analysis.get('nvd', None) \
+                if isinstance(composition_analysis, dict) else None
         return SastyWrapper.execute_parallel(scan_fns, config, 'nodejs')
 
     @staticmethod
     def npm(config, results=None):
         deps = get_dependencies(SastyWrapper.get_code_path(config), config.get('add_devdep'))
         exec_cmd = "npm audit --json"
-        res = execute(exec_cmd, cwd=SastyWrapper.get_code_path(config))
-        with open('/tmp/npm_audit.json', 'w') as npm_audit:
-            print(res[0].decode(encoding='ascii', errors='ignore'), file=npm_audit)
-        result = NpmScanParser("/tmp/npm_audit.json", "NpmScan", deps).items
+        spec = get_tool("npm")
+        report_path = spec.report_path(get_work_dir(config, spec.name))
+        execute_streaming(exec_cmd, report_path, cwd=SastyWrapper.get_code_path(config),
+                          timeout=config.get("timeout", None))
+        result = spec.get_parser()(report_path, "NpmScan", deps).items
         return SastyWrapper.extend_result(results, result)
 
     @staticmethod
     def retirejs(config, results=None):
         deps = get_dependencies(SastyWrapper.get_code_path(config), config.get('add_devdep'))
+        spec = get_tool("retirejs")
+        work_dir = get_work_dir(config, spec.name)
+        report_path = spec.report_path(work_dir)
         exec_cmd = "retire --jspath={} --outputformat=json  " \
-                   "--outputpath=/tmp/retirejs.json --includemeta --exitwith=0"\
-            .format(SastyWrapper.get_code_path(config))
-        res = execute(exec_cmd, cwd='/tmp')
-        result = RetireScanParser("/tmp/retirejs.json", "RetireScan", deps).items
+                   "--outputpath={} --includemeta --exitwith=0"\
+            .format(SastyWrapper.get_code_path(config), report_path)
+        res = execute(exec_cmd, cwd=work_dir)
+        enricher = get_driver("nvd")(config.get('nvd'))
+        result = spec.get_parser()(report_path, "RetireScan", deps, enricher).items
         return SastyWrapper.extend_result(results, result)
 
     @staticmethod
     def nodejsscan(config, results=None):
+        spec = get_tool("nodejsscan")
+        work_dir = get_work_dir(config, spec.name)
         exec_cmd = "nodejsscan -o nodejsscan -d {}".format(SastyWrapper.get_code_source(config))
-        res = execute(exec_cmd, cwd='/tmp')
-        result = NodeJsScanParser("/tmp/nodejsscan.json", "NodeJsScan").items
+        res = execute(exec_cmd, cwd=work_dir)
+        result = spec.get_parser()(spec.report_path(work_dir), "NodeJsScan").items
         return SastyWrapper.extend_result(results, result)
 
     @staticmethod
@@ -156,7 +163,8 @@ class SastyWrapper(object):
         filtered_statuses = config.get('filtered_statuses', constants.PTAI_DEFAULT_FILTERED_STATUSES)
         if isinstance(filtered_statuses, str):
             filtered_statuses = [item.strip() for item in filtered_statuses.split(",")]
-        result = PTAIScanParser(file_path, filtered_statuses).items
+        parser_backend = config.get('parser_backend', constants.PTAI_DEFAULT_PARSER_BACKEND)
+        result = get_tool("ptai").get_parser()(file_path, filtered_statuses, parser_backend).items
         filtered_result = ptai_post_processing(config, result)
         return filtered_result
 
@@ -166,17 +174,21 @@ class SastyWrapper(object):
         for file_path in config.get('files', []):
             params_str += '-r {} '.format(file_path)
         exec_cmd = "safety check {}--full-report --json".format(params_str)
-        res = execute(exec_cmd, cwd=SastyWrapper.get_code_path(config))
-        with open('/tmp/safety_report.json', 'w') as safety_audit:
-            print(res[0].decode(encoding='ascii', errors='ignore'), file=safety_audit)
-        result = SafetyScanParser("/tmp/safety_report.json", "SafetyScan").items
+        spec = get_tool("safety")
+        report_path = spec.report_path(get_work_dir(config, spec.name))
+        execute_streaming(exec_cmd, report_path, cwd=SastyWrapper.get_code_path(config),
+                          timeout=config.get("timeout", None))
+        result = spec.get_parser()(report_path, "SafetyScan").items
         return SastyWrapper.extend_result(results, result)
 
     @staticmethod
     def dependency_check(config, results=None):
-        exec_cmd = 'dependency-check.sh -n -f JSON -o /tmp -s {} {}'.format(config['comp_path'], config['comp_opts'])
+        spec = get_tool("dependency_check")
+        work_dir = get_work_dir(config, spec.name)
+        exec_cmd = 'dependency-check.sh -n -f JSON -o {} -s {} {}'.format(work_dir, config['comp_path'],
+                                                                          config['comp_opts'])
         execute(exec_cmd, cwd=SastyWrapper.get_code_path(config))
-        result = DependencyCheckParser("/tmp/dependency-check-report.json", "dependency_check").items
+        result = spec.get_parser()(spec.report_path(work_dir), "dependency_check").items
         return SastyWrapper.extend_result(results, result)
 
     @staticmethod
@@ -189,6 +201,9 @@ class SastyWrapper(object):
     def gosec(config, results=None):
         """ Golang Security Checker """
         exec_cmd = f"gosec -fmt=json ./..."
-        cmd_output = execute(exec_cmd, cwd=SastyWrapper.get_code_path(config))
-        result = GosecOutputParser(cmd_output, "gosec").items
+        spec = get_tool("gosec")
+        report_path = spec.report_path(get_work_dir(config, spec.name))
+        execute_streaming(exec_cmd, report_path, cwd=SastyWrapper.get_code_path(config),
+                          timeout=config.get("timeout", None))
+        result = spec.get_parser()(report_path, "gosec").items
         return SastyWrapper.extend_result(results, result)
@@ -0,0 +1,81 @@
+#   Copyright 2019 getcarrier.io
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+    Concurrent scanner scheduler
+"""
+
+import logging
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class ScanScheduler(object):
+    """ Runs scanner tasks with global and per-group concurrency limits and optional memory budget """
+
+    def __init__(self, max_concurrency=1, limits=None, memory_limit=None):
+        self.max_concurrency = max(int(max_concurrency or 1), 1)
+        self.limits = dict()
+        for group, limit in (limits or dict()).items():
+            self.limits[group] = max(int(limit), 1)
+        self.memory_limit = int(memory_limit) if memory_limit else None
+
+    def _has_capacity(self, groups, running_groups):
+        for group in groups:
+            if group in self.limits and running_groups.get(group, 0) >= self.limits[group]:
+                return False
+        return True
+
+    def _has_memory(self, memory, running_memory, running):
+        # Single task is always allowed to run, even if it expects more than the budget
+        return self.memory_limit is None or not running or running_memory + memory <= self.memory_limit
+
+    def run(self, tasks):
+        """
+        Execute tasks and return their results in submission order
+
+        :param tasks: list of (name, groups, callable) or (name, groups, callable, memory) tuples
+        :return: list of callable results, ordered as tasks
+        """
+        if self.max_concurrency == 1:
+            return [task[2]() for task in tasks]
+        results = [None] * len(tasks)
+        pending = list(enumerate(tasks))
+        running = dict()
+        running_groups = dict()
+        running_memory = 0
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            while pending or running:
+                for entry in list(pending):
+                    if len(running) >= self.max_concurrency:
+                        break
+                    index, (name, groups, task) = entry[0], entry[1][:3]
+                    memory = entry[1][3] if len(entry[1]) > 3 else 0
+                    if not self._has_capacity(groups, running_groups) or \
+                            not self._has_memory(memory, running_memory, running):
+                        continue
+                    pending.remove(entry)
+                    for group in groups:
+                        running_groups[group] = running_groups.get(group, 0) + 1
+                    running_memory += memory
+                    logging.debug("Scheduling %s (groups: %s)", name, ", ".join(groups))
+                    running[executor.submit(task)] = (index, groups, memory)
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, groups, memory = running.pop(future)
+                    for group in groups:
+                        running_groups[group] -= 1
+                    running_memory -= memory
+                    results[index] = future.result()
+        return results
@@ -32,7 +32,7 @@ def main():
                 j.client.issue(id).delete()
                 print(f'Issue {id} was deleted.')
         finally:
-            j.client.close()
+            j.close()
     else:
         default_config, test_configs = config_from_yaml()
         title = 'Carrier test. Please remove this ticket. It was created for testing purposes only.'
@@ -17,13 +17,20 @@ import os
 import json
 import random
 import string
+import fnmatch
+import shutil
+import signal
 import logging
+import tempfile
 import threading
-from subprocess import Popen, PIPE
+from time import sleep, time
+from subprocess import Popen, PIPE, TimeoutExpired
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dusty import constants as c
 from traceback import format_exc
-from dusty.drivers.rp.report_portal_writer import launch_reportportal_service
+from dusty.registry import get_reporter
 
 
 def id_generator(size=6, chars=string.ascii_uppercase + string.digits):
@@ -43,7 +50,9 @@ def cwe_to_severity(cwe_score):
 
 
 def report_to_rp(config, result, issue_name):
-    rp_data_writer = launch_reportportal_service(config.get("rp_config"))
+    if not config.get("rp_config"):
+        return
+    rp_data_writer = get_reporter("reportportal")(config.get("rp_config"))
     if rp_data_writer:
         for item in result:
             item.rp_item(rp_data_writer)
@@ -54,8 +63,22 @@ def report_to_jira(config, result):
         config.get('jira_service').connect()
         jira_mapping = config.get('jira_mapping', None)
         logging.debug("Jira mapping: %s", str(jira_mapping))
-        for item in result:
-            item.jira(config['jira_service'], jira_mapping)
+        jira_service = config['jira_service']
+        jira_service.prefetch_issues([item.get_hash_code() for item in result])
+        if jira_service.max_workers > 1:
+            def _report(item, tickets):
+                with jira_service.collect_created_tickets(tickets):
+                    item.jira(jira_service, jira_mapping)
+            created_tickets = [list() for _ in result]
+            with ThreadPoolExecutor(max_workers=jira_service.max_workers) as executor:
+                futures = [executor.submit(_report, item, tickets) for item, tickets in zip(result, created_tickets)]
+            # Tickets are kept even if some finding failed, in findings order
+            jira_service.add_created_tickets(chain.from_iterable(created_tickets))
+            for future in futures:
+                future.result()
+        else:
+            for item in result:
+                item.jira(jira_service, jira_mapping)
     elif config.get('jira_service') and not config.get('jira_service').valid:
         logging.info("Jira Configuration incorrect, please fix ... ")
 
@@ -121,12 +144,21 @@ def send_emails(emails_service, jira_is_used, jira_tickets_info, attachments, er
         logging.error("Email Configuration incorrect, please fix ... ")
 
 
-def execute(exec_cmd, cwd='/tmp', communicate=True):
+def execute(exec_cmd, cwd='/tmp', communicate=True, timeout=None, kill_on_timeout=True):
     logging.info(f'Running: {exec_cmd}')
-    proc = Popen(exec_cmd.split(), cwd=cwd, stdout=PIPE, stderr=PIPE)
+    # Own session, so that timeout stops wrapper scripts together with the tools they started
+    proc = Popen(exec_cmd.split(), cwd=cwd, stdout=PIPE, stderr=PIPE, start_new_session=True)
 
     if communicate:
-        res = proc.communicate()
+        try:
+            res = proc.communicate(timeout=timeout)
+        except TimeoutExpired:
+            stop_process(proc, kill_on_timeout)
+            proc.communicate()
+            raise
+        except BaseException:
+            stop_process(proc)
+            raise
         logging.debug(f"stdout: {res[0]}")
         logging.debug(f"stderr: {res[1]}")
         return res
@@ -134,49 +166,264 @@ def execute(exec_cmd, cwd='/tmp', communicate=True):
         return proc
 
 
+def signal_process_group(proc, signum):
+    """ Sends signal to process group started by execute, False if no process is left in it """
+    try:
+        os.killpg(proc.pid, signum)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def stop_process(proc, kill=True):
+    """ Stops process with all its children: kill at once or terminate and kill after grace period """
+    if kill:
+        signal_process_group(proc, signal.SIGKILL)
+        return
+    if not signal_process_group(proc, signal.SIGTERM):
+        return
+    deadline = time() + c.PROCESS_TERMINATE_TIMEOUT
+    # Direct child is reaped by poll(), otherwise its zombie keeps the group alive
+    while proc.poll() is None or signal_process_group(proc, 0):
+        if time() >= deadline:
+            signal_process_group(proc, signal.SIGKILL)
+            return
+        sleep(0.1)
+
+
+class FileSink(object):
+    """ Streams command output into file """
+
+    def __init__(self, path):
+        self.path = path
+
+    def open(self):
+        return open(self.path, "wb")
+
+
+class LineSink(object):
+    """ Splits streamed output into lines and passes them to callback """
+
+    def __init__(self, callback, encoding="utf-8"):
+        self.callback = callback
+        self.encoding = encoding
+        self._tail = b""
+
+    def write(self, chunk):
+        lines = (self._tail + chunk).split(b"\n")
+        self._tail = lines.pop()
+        for line in lines:
+            self.callback(line.decode(self.encoding, errors="ignore"))
+
+    def close(self):
+        if self._tail:
+            self.callback(self._tail.decode(self.encoding, errors="ignore"))
+            self._tail = b""
+
+
+def execute_streaming(exec_cmd, sink, cwd='/tmp', timeout=None, kill_on_timeout=True):
+    """
+    Runs command and streams its stdout into sink without buffering it in memory
+
+    :param sink: file path or FileSink (stdout goes straight to file), callable (called per line),
+                 LineSink or any incremental parser-like object with write()/feed() and close()
+    :param timeout: seconds to wait for command to finish
+    :param kill_on_timeout: kill process on timeout (otherwise terminate and kill after grace period)
+    :return: tuple of (return code, stderr)
+    """
+    logging.info(f'Running: {exec_cmd}')
+    if isinstance(sink, str):
+        sink = FileSink(sink)
+    elif callable(sink) and not hasattr(sink, "write"):
+        sink = LineSink(sink)
+    stdout_file = sink.open() if isinstance(sink, FileSink) else None
+    proc = Popen(exec_cmd.split(), cwd=cwd, stdout=stdout_file if stdout_file else PIPE, stderr=PIPE,
+                 start_new_session=True)
+    stderr = list()
+    stderr_reader = threading.Thread(target=lambda: stderr.append(proc.stderr.read()))
+    stderr_reader.start()
+    timed_out = threading.Event()
+
+    def _on_timeout():
+        timed_out.set()
+        stop_process(proc, kill_on_timeout)
+
+    timer = threading.Timer(timeout, _on_timeout) if timeout else None
+    if timer:
+        timer.start()
+    try:
+        if stdout_file:
+            proc.wait()
+        else:
+            write = sink.write if hasattr(sink, "write") else sink.feed
+            for chunk in iter(lambda: proc.stdout.read1(c.EXECUTE_CHUNK_SIZE), b""):
+                write(chunk)
+            proc.wait()
+            if hasattr(sink, "close"):
+                sink.close()
+    except BaseException:
+        stop_process(proc)
+        raise
+    finally:
+        if timer:
+            timer.cancel()
+        if stdout_file:
+            stdout_file.close()
+        stderr_reader.join()
+    stderr = stderr[0] if stderr else b""
+    logging.debug(f"stderr: {stderr}")
+    if timed_out.is_set():
+        raise TimeoutExpired(exec_cmd, timeout, stderr=stderr)
+    return proc.returncode, stderr
+
+
+def prepare_work_dir(base_dir=None):
+    """ Creates scratch directory for the whole run """
+    base_dir = base_dir if base_dir else c.PATH_TO_WORK_DIR
+    os.makedirs(base_dir, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix="dusty_", dir=base_dir)
+    logging.debug("Using work directory %s", work_dir)
+    return work_dir
+
+
+def get_work_dir(config, tool_name):
+    """ Creates isolated scratch directory for single tool invocation """
+    run_dir = config.get("work_dir", None)
+    if not run_dir:
+        run_dir = prepare_work_dir()
+        config["work_dir"] = run_dir
+    os.makedirs(run_dir, exist_ok=True)
+    return tempfile.mkdtemp(prefix=f"{tool_name}_", dir=run_dir)
+
+
+def cleanup_work_dir(config, debug=False):
+    """ Removes run scratch directory (kept in debug mode) """
+    work_dir = config.get("work_dir", None)
+    if not work_dir or debug or os.environ.get("debug", False):
+        return
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+
 def find_ip(str):
     ip_pattern = re.compile('\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}\s')
     ip = re.findall(ip_pattern, str)
     return ip
 
 
-def process_false_positives(results, config):
-    path_to_config = config.get('path_to_false_positive', c.FALSE_POSITIVE_CONFIG)
-    false_positives = []
-    if os.path.exists(path_to_config):
+class FalsePositiveRules(object):
+    """ Hashed index of false positive hashes plus optional glob/regex rules """
+
+    def __init__(self, hashes=None, globs=None, regexes=None):
+        self.hashes = hashes if hashes else set()
+        self.glob_pattern = re.compile("|".join(f"(?:{fnmatch.translate(item)})" for item in globs)) \
+            if globs else None
+        self.regex_patterns = list()
+        for item in regexes or list():
+            # Rules are compiled one by one, so flags and backreferences keep their meaning
+            try:
+                self.regex_patterns.append(re.compile(item))
+            except re.error as e:
+                logging.warning("Skipping invalid false positive regex %s: %s", item, str(e))
+
+    def __bool__(self):
+        return bool(self.hashes or self.glob_pattern or self.regex_patterns)
+
+    def is_false_positive(self, item):
+        """ Rules are matched against finding error string (source of issue hash) """
+        if item.get_hash_code() in self.hashes:
+            return True
+        if self.glob_pattern or self.regex_patterns:
+            error_string = item.finding_error_string().strip()
+            if self.glob_pattern and self.glob_pattern.match(error_string):
+                return True
+            if any(pattern.search(error_string) for pattern in self.regex_patterns):
+                return True
+        return False
+
+
+false_positives_cache = dict()
+false_positives_lock = threading.Lock()
+
+
+def load_false_positives(path_to_config):
+    """ Loads false positive rules once, reloads them only when file changes """
+    try:
+        stat = os.stat(path_to_config)
+    except OSError:
+        return FalsePositiveRules()
+    cache_key = (stat.st_mtime_ns, stat.st_size)
+    with false_positives_lock:
+        cached = false_positives_cache.get(path_to_config, None)
+        if cached and cached[0] == cache_key:
+            return cached[1]
+        hashes = set()
+        globs = list()
+        regexes = list()
         with open(path_to_config, 'r') as f:
-            for line in f.readlines():
-                if line.strip():
-                    false_positives.append(line.strip())
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                if line.startswith(c.FALSE_POSITIVE_GLOB_PREFIX):
+                    globs.append(line[len(c.FALSE_POSITIVE_GLOB_PREFIX):])
+                elif line.startswith(c.FALSE_POSITIVE_REGEX_PREFIX):
+                    regexes.append(line[len(c.FALSE_POSITIVE_REGEX_PREFIX):])
+                else:
+                    hashes.add(line)
+        rules = FalsePositiveRules(hashes, globs, regexes)
+        logging.debug("Loaded %d false positive hashes and %d rules from %s",
+                      len(hashes), len(globs) + len(regexes), path_to_config)
+        false_positives_cache[path_to_config] = (cache_key, rules)
+        return rules
+
+
+def filter_false_positives(results, config):
+    """ Drops false positives lazily, so that streamed results are not collected before filtering """
+    path_to_config = config.get('path_to_false_positive', c.FALSE_POSITIVE_CONFIG)
+    false_positives = load_false_positives(path_to_config)
     if not false_positives:
-        return results
-    to_remove = []
-    results = list(results)
-    for index in range(len(results)):
-        if results[index].get_hash_code() in false_positives:
-            to_remove.append(results[index])
-    for _ in to_remove:
-        results.pop(results.index(_))
-    return results
+        return iter(results)
+    return (item for item in results if not false_positives.is_false_positive(item))
 
 
-def process_min_priority(config, results, other_results=None):
-    to_remove = []
-    results = list(results)
+def process_false_positives(results, config):
+    return list(filter_false_positives(results, config))
+
+
+SEVERITY_RANKS = {severity: c.JIRA_SEVERITIES[priority] for severity, priority in c.SEVERITY_MAPPING.items()}
+
+
+def partition(results, predicate):
+    """ Splits results into (matching, other) lists in one pass, keeping order """
+    matching = []
+    other = []
     for item in results:
-        if c.JIRA_SEVERITIES.get(c.SEVERITY_MAPPING.get(item.finding['severity'])) > \
-                c.JIRA_SEVERITIES.get(config.get('min_priority', c.MIN_PRIORITY)):
-            to_remove.append(item)
-    for _ in to_remove:
-        item = results.pop(results.index(_))
-        if isinstance(other_results, list):
-            other_results.append(item)
+        (matching if predicate(item) else other).append(item)
+    return matching, other
+
+
+def min_priority_filter(min_priority=c.MIN_PRIORITY):
+    """ Makes predicate telling if finding is severe enough to be reported """
+    max_rank = c.JIRA_SEVERITIES.get(min_priority)
+
+    def _predicate(item):
+        rank = SEVERITY_RANKS.get(item.finding['severity'], None)
+        return rank is None or rank <= max_rank
+
+    return _predicate
+
+
+def process_min_priority(config, results, other_results=None):
+    results, other = partition(results, min_priority_filter(config.get('min_priority', c.MIN_PRIORITY)))
+    if isinstance(other_results, list):
+        other_results.extend(other)
     return results
 
 
 def common_post_processing(config, result, tool_name, need_other_results=False, global_errors=None):
+    """ Filters and reports tool results, result may be an iterator which is consumed in a single pass """
     other_results = []
-    filtered_result = process_false_positives(result, config)
+    filtered_result = filter_false_positives(result, config)
     filtered_result = process_min_priority(config, filtered_result, other_results=other_results)
     try:
         report_to_rp(config, filtered_result, tool_name)
@@ -198,7 +445,7 @@ def common_post_processing(config, result, tool_name, need_other_results=False,
 
 
 def ptai_post_processing(config, result):
-    filtered_result = process_false_positives(result, config)
+    filtered_result = filter_false_positives(result, config)
     filtered_result = process_min_priority(config, filtered_result)
     report_to_jira(config, filtered_result)
     return filtered_result
@@ -266,13 +513,12 @@ def prepare_jira_mapping(jira_service):
     issue_type = "Bug"
     if jira_service.fields["issuetype"]["name"] != "!default_issuetype":
         issue_type = jira_service.fields["issuetype"]["name"]
-    project_priorities = get_project_priorities(
-        jira_service.client,
-        jira_service.project,
-        issue_type
+    project_priorities = jira_service.get_metadata(
+        "priorities",
+        lambda: get_project_priorities(jira_service.client, jira_service.project, issue_type),
+        jira_service.project, issue_type
     )
     if not project_priorities:
-        jira_service.client.close()
         return None
     logging.debug(
         "%s %s priorities: %s",
@@ -292,7 +538,6 @@ def prepare_jira_mapping(jira_service):
                     break
             if severity not in mapping:
                 logging.error("Failed to find Jira mapping for %s", severity)
-    jira_service.client.close()
     return mapping
 
 
@@ -0,0 +1,154 @@
+#   Copyright 2019 getcarrier.io
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import gc
+import tracemalloc
+
+import pytest
+
+from dusty.data_model.canonical_model import EMPTY_LIST, TITLE_FILTER, Endpoint, make_endpoint, DefaultModel as Finding
+
+
+def make_finding(**kwargs):
+    return Finding(title="SQL Injection!", tool="zap", description="line\nline", severity="High",
+                   cwe=89, url="http://host/path", **kwargs)
+
+
+def test_finding_view_reads_record_like_dict():
+    finding = make_finding(steps_to_reproduce="step")
+    assert list(finding.finding) == [
+        "title", "date", "description", "severity", "confidence", "tool", "static_finding", "dynamic_finding",
+        "steps_to_reproduce", "references", "impact", "mitigation", "severity_justification",
+        "static_finding_details", "dynamic_finding_details", "error_string", "error_hash"]
+    assert finding.finding["title"] == "SQL Injection"
+    assert finding.finding["description"] == "line\n\nline"
+    assert finding.finding["steps_to_reproduce"] == ["step"]
+    assert dict(finding.finding["static_finding_details"]) == {
+        "file_name": "", "line_number": None, "cwe": 89, "url": "http://host/path"}
+    assert finding.finding["dynamic_finding_details"]["endpoints"] == []
+    with pytest.raises(KeyError):
+        finding.finding["missing"]
+
+
+def test_finding_view_is_cached():
+    finding = make_finding()
+    assert finding.finding is finding.finding
+    assert finding.finding["static_finding_details"] is finding.finding["static_finding_details"]
+
+
+def test_empty_lists_are_shared_until_accessed():
+    finding, other = make_finding(), make_finding()
+    assert finding._steps_to_reproduce is EMPTY_LIST and finding._dynamic_endpoints is EMPTY_LIST
+    assert finding._endpoints is EMPTY_LIST and finding._unsaved_endpoints is EMPTY_LIST
+    assert finding._images is EMPTY_LIST
+    assert "Steps To Reproduce" not in str(finding) and finding.get_hash_code()
+    assert finding._steps_to_reproduce is EMPTY_LIST
+    finding.finding["steps_to_reproduce"].append("step")
+    finding.finding["dynamic_finding_details"]["endpoints"].append(make_endpoint(host="10.0.0.1", port=80))
+    finding.unsaved_endpoints.append(make_endpoint(host="10.0.0.2", port=80))
+    finding.images.append({"name": "screenshot"})
+    rendered = str(finding)
+    assert "step" in rendered and "10.0.0.1:80" in rendered and "10.0.0.2:80" in rendered
+    assert finding.images == [{"name": "screenshot"}]
+    assert other.finding["steps_to_reproduce"] == [] and other.unsaved_endpoints == [] and other.images == []
+    assert EMPTY_LIST == ()
+
+
+def test_finding_view_writes_and_invalidates_hash():
+    finding = make_finding()
+    initial_hash = finding.get_hash_code()
+    finding.finding["title"] = "Other"
+    assert finding.get_hash_code() != initial_hash
+    finding.finding["static_finding_details"]["line_number"] = 10
+    assert "_10_" in finding.finding_error_string()
+    finding.finding["steps_to_reproduce"].append("step")
+    assert "step" in str(finding)
+    finding.finding["custom"] = {"key": "value"}
+    finding.finding["dynamic_finding_details"]["custom"] = 1
+    assert finding.finding["custom"] == {"key": "value"}
+    assert list(finding.finding)[-1] == "custom"
+    assert list(finding.finding["dynamic_finding_details"])[-1] == "custom"
+    assert "custom" not in finding.finding["static_finding_details"]
+    del finding.finding["custom"]
+    assert "custom" not in finding.finding
+
+
+def test_finding_assignment_replaces_record():
+    finding = make_finding()
+    finding.finding = {"title": "New", "static_finding_details": {"cwe": 79}}
+    assert finding.finding["title"] == "New"
+    assert finding.finding["severity"] is None
+    assert finding.finding["static_finding_details"]["cwe"] == 79
+    assert finding.finding["static_finding_details"]["url"] is None
+
+
+def test_endpoints_are_normalized_values():
+    endpoint = make_endpoint(protocol="HTTPS", host="Example.com:443", path="/path/")
+    assert str(endpoint) == "https://example.com/path"
+    assert endpoint == Endpoint(protocol="https", host="example.com", port=443, path="/path")
+    assert make_endpoint(protocol="https", host="example.com", path="/path") is endpoint
+    assert len({endpoint, Endpoint(protocol="https", host="example.com", port="8443")}) == 2
+    with pytest.raises(AttributeError):
+        endpoint.host = "other"
+
+
+def test_transport_endpoints_keep_nmap_rendering():
+    assert str(make_endpoint(protocol="tcp", host="10.0.0.1", port="22")) == "10.0.0.1:22/tcp"
+    assert str(make_endpoint(host="10.0.0.1", port=80)) == "10.0.0.1:80"
+
+
+FINDINGS_COUNT = 100000
+FINDING_MEMORY_BUDGET = 400  # bytes per finding, record dict of previous model took about 1250
+
+
+class DictFinding(object):
+    """ Previous finding representation: nested record dicts and lists allocated for every finding """
+
+    def __init__(self, title, severity, description, tool, cwe=None, url=None, line_number=None, file_path=None):
+        self.finding = {
+            "title": TITLE_FILTER.sub('', title), "date": None,
+            "description": description.replace("\n", "\n\n"), "severity": severity, "confidence": None,
+            "tool": tool, "static_finding": None, "dynamic_finding": None, "steps_to_reproduce": [],
+            "references": None, "impact": None, "mitigation": None, "severity_justification": None,
+            "static_finding_details": {"file_name": file_path, "line_number": line_number, "cwe": cwe, "url": url},
+            "dynamic_finding_details": {"payload": None, "cwe": cwe, "url": url, "endpoints": []},
+            "error_string": None, "error_hash": None}
+        self.severity = 1
+        self.unsaved_endpoints = []
+        self.images = []
+        self.endpoints = []
+        self.scan_type = ""
+
+
+def memory_per_finding(model):
+    titles = [f"Hardcoded password {index}" for index in range(FINDINGS_COUNT)]
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        findings = [model(title=title, severity="High", description="Possible hardcoded password", tool="bandit",
+                          file_path="app/settings.py", line_number=10) for title in titles]
+        used = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    assert len(findings) == FINDINGS_COUNT
+    return used / FINDINGS_COUNT
+
+
+def test_finding_memory_benchmark():
+    new = memory_per_finding(Finding)
+    old = memory_per_finding(DictFinding)
+    print(f"bytes per finding: dict record {old:.0f}, slotted model {new:.0f}")
+    assert new <= FINDING_MEMORY_BUDGET
+    assert new * 3 <= old
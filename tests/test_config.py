@@ -0,0 +1,71 @@
+#   Copyright 2019 getcarrier.io
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import sys
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+
+yaml = pytest.importorskip("yaml")
+
+from dusty import run
+from dusty.cache import DiskCache
+
+CONFIG = "basic:\n  zap:\n    target: !env http://a.com\n  min_priority: {priority}\n"
+
+
+@pytest.fixture
+def config_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("config_cache", str(tmp_path / "cache"))
+    monkeypatch.setattr(run, "config_cache", dict())
+    return DiskCache("config", path=str(tmp_path / "cache"))
+
+
+def test_edited_config_is_read_again(tmp_path, config_cache):
+    path = tmp_path / "scan-config.yaml"
+    args = SimpleNamespace(config=str(path), config_data=None)
+    path.write_text(CONFIG.format(priority="Major"))
+    first = run.read_config(args)
+    assert first["basic"]["min_priority"] == "Major"
+    assert first["basic"]["zap"]["target"] == "!envhttp://a.com"
+    path.write_text(CONFIG.format(priority="Minor"))
+    assert run.read_config(args)["basic"]["min_priority"] == "Minor"
+    # Both versions are kept on disk under their own content hash
+    assert len(os.listdir(config_cache.path)) == 2
+
+
+def test_disk_cache_entry_is_used_for_same_content(config_cache):
+    config_data = CONFIG.format(priority="Major").encode("utf-8")
+    content_hash = run.hashlib.sha256(config_data).hexdigest()
+    assert run.load_config_data(config_data) == config_cache.get(content_hash)
+    config_cache.set(content_hash, {"cached": True})
+    assert run.load_config_data(config_data) == {"cached": True}
+
+
+def test_config_loader_falls_back_to_pure_python_loader():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = "\n".join([
+        "import yaml",
+        "del yaml.CSafeLoader",
+        "from dusty import run",
+        "assert issubclass(run.ConfigLoader, yaml.SafeLoader)",
+        "print(run.load_config_data(b'target: !env http://a.com'))",
+    ])
+    result = subprocess.run([sys.executable, "-c", script], cwd=root, stdout=subprocess.PIPE,
+                            universal_newlines=True, check=True)
+    assert result.stdout.strip() == "{'target': '!envhttp://a.com'}"
+    if hasattr(yaml, "CSafeLoader"):
+        assert issubclass(run.ConfigLoader, yaml.CSafeLoader)
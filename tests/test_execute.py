@@ -0,0 +1,123 @@
+#   Copyright 2019 getcarrier.io
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import sys
+from subprocess import TimeoutExpired
+from time import sleep, time
+
+import pytest
+
+from dusty import constants as c
+from dusty.utils import FileSink, LineSink, execute, execute_streaming
+
+# Wrapper script which, like tool wrappers, leaves its own child behind
+WRAPPER = """{trap}
+sleep 30 &
+echo $! > {pid_file}
+sleep 30
+"""
+
+
+def write_script(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def make_wrapper(tmp_path, ignore_term=False):
+    pid_file = tmp_path / "child.pid"
+    script = write_script(tmp_path, "wrapper.sh",
+                          WRAPPER.format(trap="trap '' TERM" if ignore_term else "", pid_file=pid_file))
+    return f"sh {script}", pid_file
+
+
+def is_running(pid):
+    """ True if process exists and is not a zombie """
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            return stat.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def assert_stopped(pid_file):
+    pid = int(pid_file.read_text())
+    deadline = time() + 2
+    while is_running(pid) and time() < deadline:
+        sleep(0.05)
+    assert not is_running(pid)
+
+
+def test_file_sink_gets_whole_output(tmp_path):
+    script = write_script(tmp_path, "print.py", "import sys\nsys.stdout.write('x' * (3 * 1024 * 1024 + 7))\n")
+    report = tmp_path / "report.txt"
+    returncode, _ = execute_streaming(f"{sys.executable} {script}", FileSink(str(report)), cwd=str(tmp_path))
+    assert returncode == 0
+    assert report.stat().st_size == 3 * 1024 * 1024 + 7
+
+
+def test_line_sink_joins_lines_split_across_chunks():
+    lines = list()
+    sink = LineSink(lines.append)
+    for chunk in (b"fir", b"st\nsec", b"ond\n", b"\xd0", b"\xb6 tail"):
+        sink.write(chunk)
+    assert lines == ["first", "second"]
+    sink.close()
+    assert lines == ["first", "second", "ж tail"]
+
+
+def test_streaming_calls_back_per_line(tmp_path, monkeypatch):
+    monkeypatch.setattr(c, "EXECUTE_CHUNK_SIZE", 4)
+    script = write_script(tmp_path, "lines.py", "for index in range(100):\n    print('line', index)\n")
+    lines = list()
+    returncode, _ = execute_streaming(f"{sys.executable} {script}", lines.append, cwd=str(tmp_path))
+    assert returncode == 0
+    assert lines == [f"line {index}" for index in range(100)]
+
+
+def test_execute_timeout_kills_children(tmp_path):
+    command, pid_file = make_wrapper(tmp_path)
+    started = time()
+    with pytest.raises(TimeoutExpired):
+        execute(command, cwd=str(tmp_path), timeout=1)
+    assert time() - started < 5
+    assert_stopped(pid_file)
+
+
+def test_streaming_timeout_kills_children(tmp_path):
+    command, pid_file = make_wrapper(tmp_path)
+    started = time()
+    with pytest.raises(TimeoutExpired):
+        execute_streaming(command, list().append, cwd=str(tmp_path), timeout=1)
+    assert time() - started < 5
+    assert_stopped(pid_file)
+
+
+def test_streaming_timeout_terminates_children(tmp_path):
+    command, pid_file = make_wrapper(tmp_path)
+    started = time()
+    with pytest.raises(TimeoutExpired):
+        execute_streaming(command, str(tmp_path / "out.txt"), cwd=str(tmp_path), timeout=1, kill_on_timeout=False)
+    assert time() - started < 5
+    assert_stopped(pid_file)
+
+
+def test_terminate_falls_back_to_kill(tmp_path, monkeypatch):
+    monkeypatch.setattr(c, "PROCESS_TERMINATE_TIMEOUT", 0.5)
+    command, pid_file = make_wrapper(tmp_path, ignore_term=True)
+    started = time()
+    with pytest.raises(TimeoutExpired):
+        execute(command, cwd=str(tmp_path), timeout=1, kill_on_timeout=False)
+    assert time() - started < 5
+    assert_stopped(pid_file)
@@ -0,0 +1,76 @@
+#   Copyright 2019 getcarrier.io
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+from dusty.utils import FalsePositiveRules, load_false_positives, process_false_positives, common_post_processing
+from dusty.data_model.canonical_model import DefaultModel as Finding
+
+
+def make_finding(title):
+    return Finding(title=title, tool="test", description="description", severity="High")
+
+
+def test_hash_rule():
+    finding = make_finding("SQL Injection")
+    rules = FalsePositiveRules(hashes={finding.get_hash_code()})
+    assert rules.is_false_positive(finding)
+    assert not rules.is_false_positive(make_finding("XSS"))
+
+
+def test_glob_rule():
+    rules = FalsePositiveRules(globs=["SQL*"])
+    assert rules.is_false_positive(make_finding("SQL Injection"))
+    assert not rules.is_false_positive(make_finding("Blind SQL Injection"))
+
+
+def test_regex_rules_keep_own_flags_and_groups():
+    rules = FalsePositiveRules(regexes=["^xss", "(?i)cookie", r"(\w+) \1"])
+    assert rules.is_false_positive(make_finding("Missing COOKIE flag"))
+    assert rules.is_false_positive(make_finding("Header Header duplicated"))
+    assert rules.is_false_positive(make_finding("xss in form"))
+    assert not rules.is_false_positive(make_finding("Reflected xss"))
+
+
+def test_invalid_regex_is_skipped():
+    rules = FalsePositiveRules(regexes=["[unclosed", "Injection"])
+    assert len(rules.regex_patterns) == 1
+    assert rules.is_false_positive(make_finding("SQL Injection"))
+
+
+def test_process_false_positives_from_file(tmp_path):
+    keep = make_finding("XSS")
+    hashed = make_finding("Open redirect")
+    path = tmp_path / "false_positive.config"
+    path.write_text(f"# comment\n{hashed.get_hash_code()}\nglob:SQL*\nregex:[broken\nregex:(?i)^csrf\n")
+    results = [keep, hashed, make_finding("SQL Injection"), make_finding("CSRF token missing")]
+    assert process_false_positives(results, {"path_to_false_positive": str(path)}) == [keep]
+    assert load_false_positives(str(path)) is load_false_positives(str(path))
+
+
+def test_post_processing_consumes_streamed_results_once(tmp_path):
+    path = tmp_path / "false_positive.config"
+    path.write_text("glob:SQL*\n")
+    findings = [make_finding("XSS"), make_finding("SQL Injection"), make_finding("Open redirect")]
+    findings[2].finding["severity"] = "Low"
+    consumed = []
+
+    def _stream():
+        for item in findings:
+            consumed.append(item)
+            yield item
+
+    config = {"path_to_false_positive": str(path), "min_priority": "Major"}
+    results, other_results = common_post_processing(config, _stream(), "test", need_other_results=True)
+    assert results == [findings[0]]
+    assert other_results == [findings[2]]
+    assert consumed == findings
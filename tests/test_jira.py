@@ -0,0 +1,239 @@
+#   Copyright 2019 getcarrier.io
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import re
+import json
+import threading
+from copy import deepcopy
+from time import sleep
+from types import SimpleNamespace
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+jira = pytest.importorskip("dusty.drivers.jira")
+run = pytest.importorskip("dusty.run")
+
+from dusty import constants as c
+from dusty.utils import report_to_jira
+from dusty.scheduler import ScanScheduler
+from dusty.data_model.canonical_model import DefaultModel as Finding
+
+
+class FakeJira(object):
+    """ In-memory Jira client: issues are found by hashes mentioned in JQL """
+
+    def __init__(self, *args, **kwargs):
+        self.issues = list()
+        self.lock = threading.Lock()
+        self._session = SimpleNamespace(mount=lambda prefix, adapter: None)
+
+    def projects(self):
+        return [SimpleNamespace(key="TEST")]
+
+    def search_issues(self, jql, maxResults=50):
+        hashes = set(re.findall(r"[0-9a-f]{64}", jql))
+        with self.lock:
+            return [issue for issue in self.issues if hashes & set(issue.fields.labels)]
+
+    def create_issue(self, fields):
+        if fields["summary"].startswith("Broken"):
+            raise jira.JIRAError(status_code=400, text="Field 'priority' is invalid")
+        with self.lock:
+            key = f"TEST-{len(self.issues) + 1}"
+            issue = SimpleNamespace(key=key, id=key, fields=SimpleNamespace(
+                summary=fields["summary"], description=fields["description"], labels=list(fields["labels"]),
+                priority=fields["priority"]["name"], assignee=None, status=SimpleNamespace(name="Open"),
+                created="2019-01-01T00:00:00.000+0000"))
+            self.issues.append(issue)
+        return issue
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def jira_service(monkeypatch):
+    monkeypatch.setattr(jira, "JIRA", FakeJira)
+    service = jira.JiraWrapper("http://jira", "user", "password", "test", max_workers=4, metadata_cache_ttl=0)
+    assert service.valid
+    return service
+
+
+def make_findings(*titles):
+    findings = list()
+    for title in titles:
+        finding = Finding(title=title, tool="test", description="description", severity="High")
+        finding.scan_type = "SAST"
+        findings.append(finding)
+    return findings
+
+
+def test_concurrent_workers_create_each_issue_once_in_findings_order(jira_service):
+    findings = make_findings(*[f"Issue {index}" for index in range(20)])
+    report_to_jira({"jira_service": jira_service}, findings)
+    report_to_jira({"jira_service": jira_service}, findings)
+    tickets = jira_service.get_created_tickets()
+    assert len(jira_service.client.issues) == 20
+    assert [ticket["description"] for ticket in tickets] == [f"Issue {index}" for index in range(20)] * 2
+    assert [ticket["new"] for ticket in tickets] == [True] * 20 + [False] * 20
+
+
+class FakeTool(object):
+    """ SAST scanner reporting its findings to Jira, later scanners finish first """
+
+    kind = "sast"
+
+    @staticmethod
+    def run(config):
+        sleep(config["delay"])
+        report_to_jira(config, config["findings"])
+        return config["findings"]
+
+
+def test_shared_wrapper_merges_tickets_of_concurrent_scanners_in_suite_order(jira_service, monkeypatch):
+    assert deepcopy(jira_service) is jira_service
+    monkeypatch.setattr(run, "get_tool", lambda name: FakeTool)
+    scanners = [make_findings(*[f"Issue {index}" for index in range(scanner, scanner + 10)]) for scanner in range(8)]
+    tasks = list()
+    for index, findings in enumerate(scanners):
+        config = {"jira_service": deepcopy(jira_service), "findings": findings, "delay": (8 - index) * 0.02}
+        key = f"scanner_{index}"
+        tasks.append((key, [], lambda key=key, config=config: run.run_scanner(key, config)))
+    for results, other_results, errors, jira_tickets in ScanScheduler(len(tasks)).run(tasks):
+        assert not errors
+        jira_service.add_created_tickets(jira_tickets)
+    tickets = jira_service.get_created_tickets()
+    assert sorted(issue.fields.summary for issue in jira_service.client.issues) == \
+        sorted(f"Issue {index}" for index in range(17))
+    assert [ticket["description"] for ticket in tickets] == \
+        [finding.finding["title"] for findings in scanners for finding in findings]
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_failed_issue_keeps_created_tickets(jira_service, max_workers):
+    jira_service.max_workers = max_workers
+    findings = make_findings("Issue 0", "Issue 1", "Broken", "Issue 2", "Issue 3")
+    with pytest.raises(jira.JIRAError):
+        report_to_jira({"jira_service": jira_service}, findings)
+    created = [ticket["description"] for ticket in jira_service.get_created_tickets()]
+    if max_workers == 1:
+        assert created == ["Issue 0", "Issue 1"]
+    else:
+        assert created == ["Issue 0", "Issue 1", "Issue 2", "Issue 3"]
+
+
+def test_rate_limiter_spaces_requests():
+    limiter = jira.RateLimiter(50, burst=1)
+    timestamps = list()
+    for _ in range(5):
+        limiter.acquire()
+        timestamps.append(jira.monotonic())
+    assert timestamps[-1] - timestamps[0] >= 4 / 50 * 0.9
+
+
+class JiraHandler(BaseHTTPRequestHandler):
+    """ Jira REST API stub, answers first search with 429 and first issue creation with 503 """
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body=None, headers=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or dict()).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def issue_json(self, issue):
+        return dict(issue, self=f"{self.server.url}/rest/api/2/issue/{issue['id']}")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        server = self.server
+        server.requests.append(("GET", url.path))
+        if url.path == "/rest/api/2/serverInfo":
+            return self.reply(200, {"baseUrl": server.url, "version": "8.0.0", "versionNumbers": [8, 0, 0],
+                                    "deploymentType": "Server"})
+        if url.path == "/rest/api/2/project":
+            return self.reply(200, [{"id": "1", "key": "TEST", "name": "Test"}])
+        if url.path == "/rest/api/2/field":
+            return self.reply(200, [])
+        if url.path == "/rest/api/2/search":
+            server.searches += 1
+            if server.searches == 1:
+                return self.reply(429, {"errorMessages": ["Rate limit exceeded"]}, {"Retry-After": "0"})
+            hashes = set(re.findall(r"[0-9a-f]{64}", parse_qs(url.query)["jql"][0]))
+            issues = [self.issue_json(issue) for issue in server.issues
+                      if hashes & set(issue["fields"]["labels"])]
+            return self.reply(200, {"startAt": 0, "maxResults": 1000, "total": len(issues), "issues": issues})
+        for issue in server.issues:
+            if url.path == f"/rest/api/2/issue/{issue['key']}":
+                return self.reply(200, self.issue_json(issue))
+        return self.reply(404, {"errorMessages": [f"{url.path} not found"]})
+
+    def do_POST(self):
+        server = self.server
+        server.requests.append(("POST", self.path))
+        fields = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["fields"]
+        server.creations += 1
+        if server.creations == 1:
+            return self.reply(503, {"errorMessages": ["Service unavailable"]})
+        key = f"TEST-{len(server.issues) + 1}"
+        server.issues.append({"id": str(len(server.issues) + 1), "key": key, "fields": {
+            "summary": fields["summary"], "description": fields["description"], "labels": fields["labels"],
+            "priority": {"name": fields["priority"]["name"]}, "assignee": None, "status": {"name": "Open"},
+            "created": "2019-01-01T00:00:00.000+0000"}})
+        return self.reply(201, {"id": str(len(server.issues)), "key": key,
+                                "self": f"{server.url}/rest/api/2/issue/{len(server.issues)}"})
+
+
+@pytest.fixture
+def jira_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), JiraHandler)
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    server.requests = list()
+    server.issues = list()
+    server.searches = 0
+    server.creations = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_retries_rate_limited_and_unavailable_responses_over_http(jira_server, monkeypatch):
+    monkeypatch.setattr(c, "JIRA_RETRY_BACKOFF", 0)
+    service = jira.JiraWrapper(jira_server.url, "user", "password", "test", max_workers=2, metadata_cache_ttl=0)
+    assert service.valid
+    findings = make_findings("Issue 0", "Issue 1")
+    report_to_jira({"jira_service": service}, findings)
+    report_to_jira({"jira_service": service}, findings)
+    service.close()
+    assert jira_server.searches == 2
+    assert jira_server.creations == 3
+    assert sorted(issue["fields"]["summary"] for issue in jira_server.issues) == ["Issue 0", "Issue 1"]
+    assert [(ticket["description"], ticket["new"]) for ticket in service.get_created_tickets()] == \
+        [("Issue 0", True), ("Issue 1", True), ("Issue 0", False), ("Issue 1", False)]
+
+
+def test_close_integrations_closes_jira_session(jira_service):
+    jira_service.connect()
+    run.close_integrations({"jira_service": jira_service, "rp_config": None})
+    assert jira_service._client is None
@@ -0,0 +1,95 @@
+#   Copyright 2019 getcarrier.io
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import pytest
+
+dustyWrapper = pytest.importorskip("dusty.dustyWrapper")
+
+DISCOVERY_OUTPUT = b"""Starting Nmap 7.80 ( https://nmap.org )
+Nmap scan report for ptr.example.net (10.0.0.1)
+Host is up (0.0010s latency).
+PORT     STATE SERVICE
+22/tcp   open  ssh
+80/tcp   open  http
+443/tcp  open  https
+8080/tcp open  http-proxy
+
+Nmap scan report for app.example.com (10.0.0.2)
+PORT    STATE SERVICE
+443/tcp open  https
+53/udp  open  domain
+
+Nmap scan report for 10.0.0.3
+PORT   STATE  SERVICE
+22/tcp closed ssh
+
+Nmap scan report for 10.0.0.4
+PORT   STATE SERVICE
+25/tcp open  smtp
+"""
+
+
+def test_discovered_ports_are_keyed_by_address_unless_name_was_configured():
+    hosts = dustyWrapper.nmap_discovered_ports(DISCOVERY_OUTPUT, ["10.0.0.1", "app.example.com", "10.0.0.4"])
+    assert hosts == {
+        "10.0.0.1": (["22", "80", "443", "8080"], []),
+        "app.example.com": (["443"], ["53"]),
+        "10.0.0.4": (["25"], [])
+    }
+
+
+def test_shards_split_ports_of_single_host():
+    hosts = {"10.0.0.1": (["22", "80", "443"], ["53"])}
+    jobs = dustyWrapper.nmap_shards(hosts, 2)
+    assert jobs == [("10.0.0.1", ["22", "443"], []), ("10.0.0.1", ["80"], ["53"])]
+
+
+def test_shards_give_every_host_own_job():
+    hosts = {"a": (["22", "80"], []), "b": (["443"], []), "c": ([], ["53"])}
+    jobs = dustyWrapper.nmap_shards(hosts, 2)
+    assert jobs == [("a", ["22", "80"], []), ("b", ["443"], []), ("c", [], ["53"])]
+    assert dustyWrapper.nmap_shards({}, 4) == []
+
+
+def test_shards_never_exceed_host_ports():
+    jobs = dustyWrapper.nmap_shards({"a": (["22"], [])}, 8)
+    assert jobs == [("a", ["22"], [])]
+
+
+def test_port_params_drop_host_probes():
+    assert dustyWrapper.nmap_port_params("-v -A -T4") == "-v -sV -sC -T4"
+    assert dustyWrapper.nmap_port_params("-v -sV -O --osscan-guess --traceroute") == "-v -sV"
+    assert dustyWrapper.nmap_port_params("-v -sVA") == "-v -sVA"
+
+
+class FakeParser(object):
+    def __init__(self, report_paths, tool_name):
+        self.items = report_paths
+
+
+def test_sharded_scan_probes_every_host_once(monkeypatch, tmp_path):
+    commands = list()
+    monkeypatch.setattr(dustyWrapper, "execute", commands.append)
+    monkeypatch.setattr(dustyWrapper.get_tool("nmap"), "parser", "tests.test_nmap:FakeParser")
+    config = {"host": "10.0.0.1, app.example.com", "params": "-v -A", "work_dir": str(tmp_path)}
+    assert dustyWrapper.nmap_sharded_scan(config, DISCOVERY_OUTPUT, "default", 6) == []
+    assert len(commands) == 5
+    assert [command.rsplit("/", 1)[1] for command in commands] == [f"nmap_{index}.xml" for index in range(5)]
+    by_host = dict()
+    for command in commands:
+        by_host.setdefault(command.split(" -oX ")[0].split()[-1], list()).append(command)
+    assert sorted(by_host) == ["10.0.0.1", "10.0.0.4", "app.example.com"]
+    for host_commands in by_host.values():
+        assert sum(" -A " in command for command in host_commands) == 1
+    assert all(" -sV -sC " in command for command in by_host["10.0.0.1"][1:])
@@ -0,0 +1,76 @@
+#   Copyright 2019 getcarrier.io
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import pytest
+
+nmap_parser = pytest.importorskip("dusty.data_model.nmap.parser")
+
+HOST = """<host><status state="up"/>
+<address addr="{ip}" addrtype="ipv4"/>
+<hostnames>{hostnames}</hostnames>
+<ports>
+<port protocol="tcp" portid="22"><state state="open"/><service name="ssh" product="OpenSSH" version="7.4"/></port>
+<port protocol="tcp" portid="23"><state state="closed"/></port>
+</ports>
+{os}</host>
+"""
+OS = '<os><osmatch name="Linux {ip}" accuracy="96"/></os>\n'
+PTR = '<hostname name="host-{index}.example.net" type="PTR"/>'
+
+
+def write_report(path, addresses, os_every=256):
+    """ Writes nmap report for given addresses, every os_every-th host with OS detection and PTR name """
+    with open(path, "w") as report:
+        report.write('<?xml version="1.0"?>\n<nmaprun scanner="nmap" args="nmap -v -A">\n')
+        for index, ip in enumerate(addresses):
+            detected = index % os_every == 0
+            report.write(HOST.format(ip=ip,
+                                     hostnames=PTR.format(index=index) if detected else "",
+                                     os=OS.format(ip=ip) if detected else ""))
+        report.write('<runstats><finished/></runstats>\n</nmaprun>\n')
+    return str(path)
+
+
+def lines(finding):
+    return [line for line in finding["description"].splitlines() if line]
+
+
+def test_class_b_network(tmp_path):
+    addresses = [f"10.20.{third}.{fourth}" for third in range(256) for fourth in range(256)]
+    report = write_report(tmp_path / "nmap.xml", addresses)
+    items = list(nmap_parser.NmapXMLParser(report, "NMAP").items)
+    assert len(items) == 65536
+    for index in (0, 1, 255, 256, 65535):
+        ip = addresses[index]
+        finding = items[index].finding
+        # Title filter drops colons
+        assert finding["title"] == f"Open port {ip}22/tcp"
+        assert str(items[index].unsaved_endpoints[0]) == f"{ip}:22/tcp"
+        port_lines = ["Port: 22", "Product: OpenSSH", "Version: 7.4"]
+        if index % 256 == 0:
+            assert lines(finding) == [f"IP Address: {ip}", f"FQDN: host-{index}.example.net",
+                                      f"Host OS: Linux {ip}", "Accuracy: 96%"] + port_lines
+        else:
+            assert lines(finding) == port_lines
+    assert sum("Host OS:" in item.finding["description"] for item in items) == 256
+    assert all(item.finding["description"].count("Host OS:") <= 1 for item in items)
+
+
+def test_shard_reports_are_merged(tmp_path):
+    first = write_report(tmp_path / "nmap_0.xml", ["10.0.0.1", "10.0.0.2"], os_every=1)
+    second = write_report(tmp_path / "nmap_1.xml", ["10.0.0.2"], os_every=2)
+    items = list(nmap_parser.NmapXMLParser([first, second], "NMAP").items)
+    assert [str(item.unsaved_endpoints[0]) for item in items] == ["10.0.0.1:22/tcp", "10.0.0.2:22/tcp"]
+    assert lines(items[1].finding).count("Port: 22") == 2
+    assert "Linux 10.0.0.1" not in items[1].finding["description"]
@@ -0,0 +1,88 @@
+#   Copyright 2019 getcarrier.io
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import json
+
+import pytest
+
+nvd = pytest.importorskip("dusty.drivers.nvd")
+requests = pytest.importorskip("requests")
+
+from dusty import constants as c
+from dusty.cache import DiskCache
+
+CVE_PAGE = '<a id="showCPERanges" data-range-description="versions up to (excluding) 1.2.3"></a>' \
+           '<p data-testid="vuln-description">Prototype pollution</p>'
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error")
+
+
+class FakeSession(object):
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.urls = list()
+
+    def get(self, url, timeout=None):
+        self.urls.append(url)
+        return self.responses.pop(0)
+
+
+def make_enricher(tmp_path, responses):
+    source = nvd.NvdWebSource()
+    source.session = FakeSession(responses)
+    return nvd.NvdEnricher(source, DiskCache("nvd", path=str(tmp_path)), max_workers=1), source.session
+
+
+def test_failed_lookup_is_not_cached(tmp_path):
+    enricher, session = make_enricher(tmp_path, [FakeResponse(429, "<html>Too Many Requests</html>"),
+                                                     FakeResponse(200, CVE_PAGE)])
+    assert enricher.get(c.NVD_URL + "CVE-2019-0001") == nvd.empty_record()
+    enricher, _ = make_enricher(tmp_path, [])
+    enricher.source.session = session
+    assert enricher.get(c.NVD_URL + "CVE-2019-0001") == {"fix_version": "1.2.3", "description": "Prototype pollution"}
+    assert len(session.urls) == 2
+
+
+def test_lookup_with_details_is_cached(tmp_path):
+    enricher, session = make_enricher(tmp_path, [FakeResponse(200, CVE_PAGE)])
+    enricher.prefetch([c.NVD_URL + "CVE-2019-0002"])
+    offline = nvd.NvdEnricher(None, DiskCache("nvd", path=str(tmp_path)))
+    assert offline.get(c.NVD_URL + "CVE-2019-0002")["fix_version"] == "1.2.3"
+
+
+def test_page_without_details_is_not_cached(tmp_path):
+    enricher, _ = make_enricher(tmp_path, [FakeResponse(200, "<html></html>")])
+    assert enricher.get(c.NVD_URL + "CVE-2019-0003") == nvd.empty_record()
+    assert DiskCache("nvd", path=str(tmp_path)).get("CVE-2019-0003") is None
+
+
+def test_feed_source_reads_local_feed(tmp_path):
+    feed = {"CVE_Items": [{
+        "cve": {"CVE_data_meta": {"ID": "CVE-2019-0004"},
+                "description": {"description_data": [{"lang": "en", "value": "Feed description"}]}},
+        "configurations": {"nodes": [{"children": [{"cpe_match": [{"versionEndExcluding": "2.0.0"}]}]}]}
+    }]}
+    (tmp_path / "nvdcve-1.1-2019.json").write_text(json.dumps(feed))
+    enricher = nvd.make_nvd_enricher({"feed_path": str(tmp_path)})
+    enricher.prefetch([c.NVD_URL + "CVE-2019-0004", c.NVD_URL + "CVE-2019-0005"])
+    assert enricher.get(c.NVD_URL + "CVE-2019-0004") == {"fix_version": "2.0.0", "description": "Feed description"}
+    assert enricher.get(c.NVD_URL + "CVE-2019-0005") == nvd.empty_record()
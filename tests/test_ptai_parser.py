@@ -0,0 +1,84 @@
+#   Copyright 2019 getcarrier.io
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+from time import perf_counter
+
+import pytest
+
+pytest.importorskip("bs4")
+pytest.importorskip("lxml")
+
+from dusty.data_model.ptai.parser import PTAIScanParser
+
+REPORT = os.path.join(os.path.dirname(__file__), "data", "ptai_report.html")
+
+
+def parse(parser_backend, report=REPORT):
+    return [(str(item), list(item.finding["steps_to_reproduce"]))
+            for item in PTAIScanParser(report, parser_backend=parser_backend).items]
+
+
+def test_lxml_backend_matches_bs4_output():
+    assert parse("lxml") == parse("bs4")
+
+
+@pytest.mark.parametrize("parser_backend", ["bs4", "lxml"])
+def test_report_findings(parser_backend):
+    items = list(PTAIScanParser(REPORT, parser_backend=parser_backend).items)
+    # Discarded vulnerability is filtered, SQL injections in one file are merged
+    assert [item.finding["title"] for item in items] == ["SQL Injection in ...\\Db.cs", "Weak Hash"]
+    assert [item.finding["severity"] for item in items] == ["High", "Medium"]
+    assert [item.finding["static_finding_details"]["file_name"] for item in items] == \
+        ["C:\\src\\app\\Db.cs", "/src/a.py"]
+    assert len(items[0].finding["steps_to_reproduce"]) == 2
+    assert "CWE-89: Improper Neutralization" in items[0].finding["steps_to_reproduce"][0]
+    assert "41 var q = sql;      <------" in items[0].finding["steps_to_reproduce"][0]
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        PTAIScanParser(REPORT, parser_backend="lmxl")
+
+
+LARGE_REPORT_VULNERABILITIES = 500
+
+
+def write_large_report(path):
+    """ Repeats first vulnerability of fixture report, every copy in its own file so that none are merged """
+    with open(REPORT, encoding="utf-8") as f:
+        report = f.read()
+    start = report.index('<div class="vulnerability">')
+    end = report.index('<div class="vulnerability">', start + 1)
+    block = report[start:end]
+    vulnerabilities = "".join(block.replace("Db.cs : 42", f"Db{index}.cs : 42")
+                              for index in range(LARGE_REPORT_VULNERABILITIES))
+    path.write_text(report[:start] + vulnerabilities + report[end:], encoding="utf-8")
+    return str(path)
+
+
+def test_lxml_backend_throughput(tmp_path):
+    report = write_large_report(tmp_path / "large_report.html")
+    timings = dict()
+    results = dict()
+    for parser_backend in ("bs4", "lxml"):
+        started = perf_counter()
+        results[parser_backend] = parse(parser_backend, report)
+        timings[parser_backend] = perf_counter() - started
+    size = os.path.getsize(report) / 1024 / 1024
+    print(", ".join(f"{backend} {size / timing:.2f} MB/s" for backend, timing in timings.items()))
+    assert len(results["lxml"]) == LARGE_REPORT_VULNERABILITIES + 2
+    assert results["lxml"] == results["bs4"]
+    # lxml is about 6 times faster on this report
+    assert timings["lxml"] * 2 < timings["bs4"]
@@ -0,0 +1,98 @@
+#   Copyright 2019 getcarrier.io
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import inspect
+from importlib.metadata import EntryPoint
+
+import pytest
+
+from dusty import registry
+
+dustyWrapper = pytest.importorskip("dusty.dustyWrapper")
+sastyWrapper = pytest.importorskip("dusty.sastyWrapper")
+
+
+def scanner_methods(wrapper):
+    return {name for name, member in vars(wrapper).items()
+            if isinstance(member, staticmethod) and not name.startswith("_")
+            and list(inspect.signature(member.__func__).parameters) == ["config"]}
+
+
+def test_every_dast_scanner_is_registered():
+    names = scanner_methods(dustyWrapper.DustyWrapper)
+    assert {"burp", "nmap", "zap"} <= names
+    for name in names:
+        spec = registry.get_tool(name)
+        assert spec.kind == "dast"
+        assert registry.resolve(spec.execute) is getattr(dustyWrapper.DustyWrapper, name)
+
+
+def test_burp_is_registered():
+    spec = registry.get_tool("burp")
+    assert registry.resolve(spec.execute) is dustyWrapper.DustyWrapper.burp
+
+
+def test_drivers_are_not_reporters():
+    for name in ("nvd", "qualys"):
+        assert name in registry.DRIVERS
+        with pytest.raises(KeyError):
+            registry.get_reporter(name)
+
+
+def test_declared_parsers_and_reports():
+    for spec in registry.TOOLS.values():
+        assert spec.parser is None or spec.parser in registry.PARSERS
+        assert spec.artifact is None or spec.parser is not None
+    nmap = registry.get_tool("nmap")
+    assert nmap.report_path("/tmp/work") == "/tmp/work/nmap.xml"
+    assert nmap.report_path("/tmp/work", 3) == "/tmp/work/nmap_3.xml"
+    with pytest.raises(KeyError):
+        registry.get_tool("burp").get_parser()
+
+
+class CustomParser(object):
+    def __init__(self, report_path, test):
+        self.items = [(report_path, test)]
+
+
+def run_custom(config):
+    spec = registry.get_tool("custom")
+    return "custom", spec.get_parser()(spec.report_path(config["work_dir"]), "Custom").items
+
+
+CUSTOM_TOOL = registry.ToolSpec("custom", "dast", "tests.test_registry:run_custom", "tests.test_registry:CustomParser",
+                                "custom.json", streaming=True)
+NOT_A_TOOL = object()
+
+
+@pytest.fixture
+def entry_points(monkeypatch):
+    monkeypatch.setattr(registry, "TOOLS", dict(registry.TOOLS))
+    points = [EntryPoint("custom", "tests.test_registry:CUSTOM_TOOL", "dusty.scanners"),
+              EntryPoint("broken", "tests.test_registry:NOT_A_TOOL", "dusty.scanners")]
+    monkeypatch.setattr(registry, "iter_entry_points", lambda group: points if group == "dusty.scanners" else [])
+
+
+def test_third_party_scanner_declares_own_parser(entry_points):
+    spec = registry.get_tool("custom")
+    assert spec is CUSTOM_TOOL
+    assert registry.get_tool("custom") is spec
+    assert spec.run({"work_dir": "/tmp/work"}) == ("custom", [("/tmp/work/custom.json", "Custom")])
+
+
+def test_unknown_and_invalid_third_party_scanners(entry_points):
+    with pytest.raises(KeyError):
+        registry.get_tool("missing")
+    with pytest.raises(TypeError):
+        registry.get_tool("broken")
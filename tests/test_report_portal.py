@@ -0,0 +1,140 @@
+#   Copyright 2019 getcarrier.io
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import threading
+from time import sleep
+
+import pytest
+
+writer = pytest.importorskip("dusty.drivers.rp.report_portal_writer")
+
+from dusty import constants
+
+
+class FakeService(object):
+    """ Records published items, first item blocks until released """
+
+    def __init__(self, **kwargs):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.items = list()
+        self.logs = list()
+        self.launch_finished = False
+
+    def start_launch(self, **kwargs):
+        pass
+
+    def start_test_item(self, name, **kwargs):
+        self.started.set()
+        self.release.wait(timeout=10)
+        self.items.append(name)
+
+    def log(self, message, **kwargs):
+        self.logs.append(message)
+
+    def finish_test_item(self, **kwargs):
+        pass
+
+    def finish_launch(self, **kwargs):
+        self.launch_finished = True
+
+    def terminate(self):
+        pass
+
+
+class SlowService(FakeService):
+    """ Answers every request with a delay, like an overloaded ReportPortal """
+
+    delay = 0.02
+
+    def start_test_item(self, name, **kwargs):
+        sleep(self.delay)
+        self.items.append(name)
+
+    def log(self, message, **kwargs):
+        sleep(self.delay)
+        self.logs.append(message)
+
+
+@pytest.fixture
+def service_class():
+    return FakeService
+
+
+@pytest.fixture
+def rp_writer(monkeypatch, service_class):
+    monkeypatch.setattr(writer, "ReportPortalService", service_class)
+    monkeypatch.setattr(constants, "RP_QUEUE_SIZE", 2)
+    rp_writer = writer.ReportPortalDataWriter("http://rp", "token", "project", launch_name="launch")
+    rp_writer.start_test()
+    return rp_writer
+
+
+def test_full_queue_blocks_producers_and_counts_backpressure(rp_writer):
+    service = rp_writer.service
+    rp_writer.publish_item("item 0", "description", [], [])
+    assert service.started.wait(timeout=10)
+    producers = [threading.Thread(target=rp_writer.publish_item, args=(f"item {index}", "description", [], []))
+                 for index in range(1, 11)]
+    for producer in producers:
+        producer.start()
+    # Publisher holds first item, two more fit into the queue, the rest of producers block
+    for _ in range(1000):
+        if rp_writer.backpressure_events == 8:
+            break
+        sleep(0.01)
+    assert rp_writer.backpressure_events == 8
+    assert sum(producer.is_alive() for producer in producers) == 8
+    service.release.set()
+    for producer in producers:
+        producer.join(timeout=10)
+    rp_writer.finish_test()
+    assert service.launch_finished
+    assert rp_writer.published_items == 11
+    assert sorted(service.items) == sorted(f"item {index}" for index in range(11))
+
+
+@pytest.mark.parametrize("service_class", [SlowService])
+def test_slow_service_applies_backpressure_and_finish_flushes_everything(rp_writer):
+    service = rp_writer.service
+    names = [f"item {index}" for index in range(20)]
+    for name in names:
+        rp_writer.publish_item(name, "description", [], [(f"{name} log", "INFO", None)])
+    # Producer outpaces the service, so it had to wait for the queue
+    assert rp_writer.backpressure_events > 0
+    rp_writer.finish_test()
+    assert service.launch_finished
+    assert rp_writer.published_items == len(names)
+    assert service.items == names
+    assert service.logs == [f"{name} log" for name in names]
+
+
+def test_long_messages_are_split(rp_writer):
+    rp_writer.service.release.set()
+    message = "x" * (constants.MAX_MESSAGE_LEN * 2 + 1)
+    rp_writer.publish_item("item", "description", [], [(message, "ERROR", None), ("", "INFO", None)])
+    service = rp_writer.service
+    rp_writer.finish_test()
+    assert [len(item) for item in service.logs] == [constants.MAX_MESSAGE_LEN, constants.MAX_MESSAGE_LEN, 1, 0]
+
+
+def test_finish_service_publishes_queued_items_once(rp_writer, monkeypatch):
+    monkeypatch.setattr(writer, "rp_service", rp_writer)
+    service = rp_writer.service
+    service.release.set()
+    rp_writer.publish_item("item", "description", [], [])
+    writer.finish_reportportal_service()
+    assert service.items == ["item"] and service.launch_finished
+    assert not rp_writer.is_test_started()
+    writer.finish_reportportal_service()
@@ -0,0 +1,98 @@
+#   Copyright 2019 getcarrier.io
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import threading
+from time import sleep
+
+from dusty.scheduler import ScanScheduler
+
+
+class Tracker(object):
+    """ Counts running tasks, overall and per group """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = dict()
+        self.peak = dict()
+        self.peak_while = dict()  # group -> most tasks running while task of group was running
+
+    def task(self, groups, result, duration=0.05):
+        def _run():
+            with self.lock:
+                for group in groups + ["all"]:
+                    self.running[group] = self.running.get(group, 0) + 1
+                    self.peak[group] = max(self.peak.get(group, 0), self.running[group])
+                for group, count in self.running.items():
+                    if count and group != "all":
+                        self.peak_while[group] = max(self.peak_while.get(group, 0), self.running["all"])
+            sleep(duration)
+            with self.lock:
+                for group in groups + ["all"]:
+                    self.running[group] -= 1
+            return result
+        return _run
+
+
+def test_group_limits_cap_concurrency():
+    tracker = Tracker()
+    tasks = [(f"net_{index}", ["network"], tracker.task(["network"], index)) for index in range(6)]
+    tasks += [(f"cpu_{index}", ["cpu"], tracker.task(["cpu"], index)) for index in range(6)]
+    results = ScanScheduler(8, {"network": 2, "cpu": 3}).run(tasks)
+    assert results == list(range(6)) * 2
+    assert tracker.peak["network"] == 2
+    assert tracker.peak["cpu"] == 3
+    assert tracker.peak["all"] == 5
+
+
+def test_global_limit_caps_concurrency():
+    tracker = Tracker()
+    tasks = [(f"task_{index}", [f"task_{index}"], tracker.task([], index)) for index in range(8)]
+    ScanScheduler(3).run(tasks)
+    assert tracker.peak["all"] == 3
+
+
+def test_memory_budget_admits_tasks_that_fit():
+    tracker = Tracker()
+    tasks = [("big_0", ["big"], tracker.task(["big"], 0), 600),
+             ("big_1", ["big"], tracker.task(["big"], 1), 600),
+             ("huge", ["huge"], tracker.task(["huge"], 2), 5000)]
+    tasks += [(f"small_{index}", ["small"], tracker.task(["small"], index + 3), 200) for index in range(4)]
+    results = ScanScheduler(8, memory_limit=1000).run(tasks)
+    assert results == list(range(7))
+    # Two big tasks never overlap, task over budget still runs, but alone
+    assert tracker.peak["big"] == 1
+    assert tracker.peak_while["huge"] == 1
+    assert tracker.peak_while["big"] <= 3
+
+
+def test_results_keep_submission_order():
+    finished = list()
+
+    def task(index):
+        def _run():
+            sleep((5 - index) * 0.03)
+            finished.append(index)
+            return index
+        return _run
+
+    results = ScanScheduler(5).run([(f"task_{index}", [], task(index)) for index in range(5)])
+    assert finished == [4, 3, 2, 1, 0]
+    assert results == [0, 1, 2, 3, 4]
+
+
+def test_single_worker_runs_tasks_in_order():
+    order = list()
+    tasks = [(f"task_{index}", ["group"], lambda index=index: order.append(index) or index) for index in range(4)]
+    assert ScanScheduler().run(tasks) == [0, 1, 2, 3]
+    assert order == [0, 1, 2, 3]
@@ -0,0 +1,47 @@
+#   Copyright 2019 getcarrier.io
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import sys
+import subprocess
+
+# Cumulative import time of dusty.run, microseconds (CLI startup without drivers is well below it)
+IMPORT_BUDGET = 300000
+HEAVY_MODULES = ["requests", "urllib3", "jira", "zapv2", "reportportal_client", "lxml", "bs4", "markdown2",
+                 "markdownify", "junit_xml", "influxdb", "redis", "qualysapi", "jinja2", "logging_loki"]
+
+
+def import_times(module):
+    """ Returns {module: cumulative microseconds} reported by python -X importtime """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=root, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    times = dict()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_cli_import_does_not_load_drivers():
+    times = import_times("dusty.run")
+    loaded = sorted(name for name in times if name.split(".")[0] in HEAVY_MODULES)
+    assert loaded == []
+
+
+def test_cli_import_time_budget():
+    assert import_times("dusty.run")["dusty.run"] < IMPORT_BUDGET
@@ -0,0 +1,70 @@
+#   Copyright 2019 getcarrier.io
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+from types import SimpleNamespace
+
+import pytest
+
+zap_parser = pytest.importorskip("dusty.data_model.zap.parser")
+
+
+class FakeZapCore(object):
+    """ Serves alerts like ZAP core API: baseurl is a prefix filter, results are paged """
+
+    def __init__(self, alerts, sites):
+        self._alerts = alerts
+        self.sites = sites
+        self.requests = list()
+
+    def alerts(self, baseurl=None, start="0", count="100"):
+        self.requests.append((baseurl, int(start)))
+        matching = [item for item in self._alerts if not baseurl or item["url"].startswith(baseurl)]
+        return matching[int(start):int(start) + int(count)]
+
+
+def make_alert(alert_id, url, name="XSS", risk="High"):
+    return {"id": str(alert_id), "url": url, "alert": name, "pluginId": name, "risk": risk,
+            "confidence": "Medium", "description": f"{name} description", "method": "GET", "param": "q"}
+
+
+def make_api(alerts, sites):
+    return SimpleNamespace(core=FakeZapCore(alerts, sites))
+
+
+def test_alerts_are_grouped_per_site_and_rule():
+    alerts = [make_alert(index, f"http://a.com/{index}") for index in range(5)] + \
+             [make_alert(5, "http://a.com/x", name="SQLi"), make_alert(6, "http://b.com/", risk="Low")]
+    findings = list(zap_parser.ZapApiParser(make_api(alerts, ["http://a.com", "http://b.com"]), "ZAP", 2).items)
+    assert [(item.finding["title"], item.finding["severity"]) for item in findings] == \
+        [("XSS", "High"), ("SQLi", "High"), ("XSS", "Low")]
+    assert findings[0].finding["dynamic_finding_details"]["payload"].count("| GET | q |") == 5
+    assert findings[2].finding["static_finding_details"]["url"] == "http://b.com"
+
+
+def test_site_findings_are_yielded_before_next_site_is_paged():
+    alerts = [make_alert(0, "http://a.com/"), make_alert(1, "http://b.com/")]
+    api = make_api(alerts, ["http://a.com", "http://b.com"])
+    findings = zap_parser.iter_api_findings(api, "ZAP", page_size=10)
+    assert next(findings).finding["static_finding_details"]["url"] == "http://a.com"
+    assert all(baseurl == "http://a.com" for baseurl, _ in api.core.requests)
+    assert next(findings).finding["static_finding_details"]["url"] == "http://b.com"
+    assert list(findings) == []
+
+
+def test_overlapping_sites_do_not_duplicate_alerts():
+    alerts = [make_alert(0, "http://a.com/"), make_alert(1, "http://a.com:8080/")]
+    api = make_api(alerts, ["http://a.com", "http://a.com:8080"])
+    findings = list(zap_parser.iter_api_findings(api, "ZAP", page_size=10))
+    assert sorted(item.finding["static_finding_details"]["url"] for item in findings) == \
+        ["http://a.com", "http://a.com:8080"]